@@ -29,7 +29,6 @@ import json
 import logging
 import math
 import os
-import struct
 import subprocess
 import wave
 from wave import Wave_read
@@ -176,9 +175,8 @@ def _read_chunk(wf: Wave_read, channels: int, chunk_size: int) -> list:
     read audio wave data in a small chunk
     """
     frame_string = wf.readframes(chunk_size)
-    unpack_string = "{0}h{0}h".format(chunk_size)
-    frame_list = list(struct.unpack(unpack_string, frame_string))
-    frames_as_channels = np.array(frame_list, dtype=np.short, ndmin=2)
+    # interleaved samples are read as an array without unpacking them one by one
+    frames_as_channels = np.frombuffer(frame_string, dtype=np.short)
     # extract only left channel
     frames_left_ch = np.reshape(frames_as_channels, (channels, chunk_size), "F")[0]
     return frames_left_ch
@@ -11,7 +11,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib
 from global_configurations import GlobalConfigurations
-from log_handler import LogManager
+from log_handler import PROGRESS, LogManager
 from exceptions import ObsFrameTerminate
 
 matplotlib.use("Agg")  # Non-interactive backend
@@ -53,21 +53,20 @@ def detect_flash_first_appearance(file_path: str, config: list):
     frames_since_flash = 0
     frame_number = 0
 
-    # Read frames
+    # Read frames, decoded into the same frame buffer
+    frame = None
     while True:
-        ret, frame = cap.read()
+        ret, frame = cap.read(frame)
         frame_number += 1
         if not ret:
             break
 
-        # print out where the processing is currently
+        # show where the processing is currently
         if frame_number % 500 == 0:
-            print(f"Processed to frame {frame_number}...")
+            logger.info("Processed to frame %d...", frame_number, extra=PROGRESS)
 
-        # Convert to grayscale
-        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        # Extract the region of interest (ROI)
-        roi = gray_frame[y_min:y_max, x_min:x_max]
+        # Extract the region of interest (ROI) and convert only the ROI to grayscale
+        roi = cv2.cvtColor(frame[y_min:y_max, x_min:x_max], cv2.COLOR_BGR2GRAY)
 
         # Get intensity at the specified pixel
         avg_intensity = np.mean(roi)
@@ -28,8 +28,9 @@ Contributor: Resillion UK Limited
 import json
 import logging
 import re
-from datetime import datetime
 from fractions import Fraction
+from functools import lru_cache
+from typing import Optional
 
 from qr_recognition.qr_decoder import DecodedQr, QrDecoder
 
@@ -45,6 +46,16 @@ class MezzanineDecodedQr(DecodedQr):
     ID;HH:MM:SS.MMM;<frame #>;<frame-rate>
     """
 
+    __slots__ = (
+        "detection_count",
+        "content_id",
+        "media_time",
+        "frame_number",
+        "frame_rate",
+        "first_camera_frame_num",
+        "last_camera_frame_num",
+    )
+
     data: str
     """qr code string"""
     location: list
@@ -94,6 +105,8 @@ class TestStatusDecodedQr(DecodedQr):
     QR code in json format contain following info
     """
 
+    __slots__ = ("status", "last_action", "current_time", "delay", "camera_frame_num")
+
     data: str
     """ qr code string"""
     location: list
@@ -132,6 +145,13 @@ class PreTestDecodedQr(DecodedQr):
     QR code in json format contain following info
     """
 
+    __slots__ = (
+        "session_token",
+        "test_id",
+        "first_camera_frame_num",
+        "last_camera_frame_num",
+    )
+
     data: str
     """ qr code string"""
     location: list
@@ -173,54 +193,38 @@ class DPCTFQrDecoder(QrDecoder):
     def translate_qr_test_runner(
         data: str, location: list, json_data, camera_frame_num: int
     ) -> DecodedQr:
-        """translate different type of test runner qr code"""
+        """translate different type of test runner qr code
+        type is selected by checking the keys present,
+        test status QR code is higher priority than the pre-test QR code.
+        """
         code = DecodedQr("", [])
 
-        try:
+        if "s" in json_data and "a" in json_data:
+            if "d" in json_data:
+                delay = int(json_data["d"])
+                current_time = float(json_data["ct"]) if "ct" in json_data else 0
+            else:
+                delay = 0
+                current_time = 0
             code = TestStatusDecodedQr(
                 data,
                 location,
                 json_data["s"],
                 json_data["a"],
-                float(json_data["ct"]),
-                int(json_data["d"]),
+                current_time,
+                delay,
                 camera_frame_num,
             )
-        except KeyError:
-            try:
-                code = TestStatusDecodedQr(
-                    data,
-                    location,
-                    json_data["s"],
-                    json_data["a"],
-                    0,
-                    int(json_data["d"]),
-                    camera_frame_num,
-                )
-            except KeyError:
-                try:
-                    code = TestStatusDecodedQr(
-                        data,
-                        location,
-                        json_data["s"],
-                        json_data["a"],
-                        0,
-                        0,
-                        camera_frame_num,
-                    )
-                except KeyError:
-                    try:
-                        code = PreTestDecodedQr(
-                            data,
-                            location,
-                            json_data["session_token"],
-                            json_data["test_id"],
-                            camera_frame_num,
-                        )
-                    except KeyError:
-                        logger.debug(
-                            "Unrecognized QR code detected: %s is ignored.", data
-                        )
+        elif "session_token" in json_data and "test_id" in json_data:
+            code = PreTestDecodedQr(
+                data,
+                location,
+                json_data["session_token"],
+                json_data["test_id"],
+                camera_frame_num,
+            )
+        else:
+            logger.debug("Unrecognized QR code detected: %s is ignored.", data)
 
         return code
 
@@ -228,21 +232,23 @@ class DPCTFQrDecoder(QrDecoder):
     def media_time_str_to_ms(media_time_str: str) -> float:
         """Change media time string to ms
         return media time from mezzanine QR code in milliseconds
+        HH:MM:SS.MMM format is ensured by the mezzanine QR code pattern,
+        so the fields are sliced instead of parsing with datetime.strptime
         """
-        media_time_datetime = datetime.strptime(media_time_str, "%H:%M:%S.%f")
-
-        ms = media_time_datetime.microsecond / 1000
-        s_to_ms = media_time_datetime.second * 1000
-        min_to_ms = media_time_datetime.minute * 60 * 1000
-        h_to_ms = media_time_datetime.hour * 60 * 60 * 1000
-        media_time = ms + s_to_ms + min_to_ms + h_to_ms
+        hours = int(media_time_str[0:2])
+        minutes = int(media_time_str[3:5])
+        seconds = int(media_time_str[6:8])
+        ms = int(media_time_str[9:12])
+        media_time = float(((hours * 60 + minutes) * 60 + seconds) * 1000 + ms)
 
         return media_time
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def frame_rate_str_to_fraction(frame_rate_str: str) -> Fraction:
         """Convert string frame rate to float
-        fractional frame rate fund match from map to get accurate number"""
+        fractional frame rate fund match from map to get accurate number
+        results are cached, as only a few frame rates are used in a recording"""
         frame_rate_map = {}
         with open("frame_rate_map.json", encoding="utf-8") as f:
             frame_rate_map = json.load(f)
@@ -253,6 +259,23 @@ class DPCTFQrDecoder(QrDecoder):
             frame_rate = Fraction(float(frame_rate_str))
         return frame_rate
 
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def parse_mezzanine_qr_data(data: str) -> Optional[tuple]:
+        """Parse mezzanine QR code data to
+        (content_id, media_time, frame_number, frame_rate),
+        None when the data is not a mezzanine QR code.
+        results are cached, as each QR code is scanned on several camera frames"""
+        match = _mezzanine_qr_data_re.match(data)
+        if not match:
+            return None
+        return (
+            match.group(1),
+            DPCTFQrDecoder.media_time_str_to_ms(match.group(2)),
+            int(match.group(3)),
+            DPCTFQrDecoder.frame_rate_str_to_fraction(match.group(4)),
+        )
+
     def translate_qr(
         self, data: str, location: list, camera_frame_num: int
     ) -> DecodedQr:
@@ -265,22 +288,22 @@ class DPCTFQrDecoder(QrDecoder):
         """
         code = DecodedQr("", [])
 
-        match = _mezzanine_qr_data_re.match(data)
-        if match:
+        mezzanine_qr_data = DPCTFQrDecoder.parse_mezzanine_qr_data(data)
+        if mezzanine_qr_data:
             # matches a mezzanine signature so decode it as such
-            media_time = DPCTFQrDecoder.media_time_str_to_ms(match.group(2))
-            frame_rate = DPCTFQrDecoder.frame_rate_str_to_fraction(match.group(4))
+            content_id, media_time, frame_number, frame_rate = mezzanine_qr_data
             code = MezzanineDecodedQr(
                 data,
                 location,
                 1,
-                match.group(1),
+                content_id,
                 media_time,
-                int(match.group(3)),
+                frame_number,
                 frame_rate,
                 camera_frame_num,
             )
-        else:
+        elif data.startswith("{"):
+            # only test runner QR codes are json objects
             try:
                 json_data = json.loads(data)
                 code = DPCTFQrDecoder.translate_qr_test_runner(
@@ -290,5 +313,7 @@ class DPCTFQrDecoder(QrDecoder):
                 logger.debug(
                     "QR code '%s' is not recognized by the system, ignored.", data
                 )
+        else:
+            logger.debug("QR code '%s' is not recognized by the system, ignored.", data)
 
         return code
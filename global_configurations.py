@@ -44,6 +44,8 @@ class GlobalConfigurations:
     """system mode for debugging purpose only"""
     qr_search_range: List[int]
     """Runs the test runner over a specific range"""
+    workers: int
+    """number of worker processes to scan QR codes in parallel"""
 
     def __init__(self):
         self.config = configparser.ConfigParser()
@@ -53,6 +55,7 @@ class GlobalConfigurations:
         self.qr_search_range = []
         self.ignore_corrupted = ""
         self.calibration_file_path = ""
+        self.workers = 1
 
     def set_qr_search_range(self, qr_search_range: str):
         """Set range"""
@@ -84,6 +87,16 @@ class GlobalConfigurations:
         """Get calibration file path"""
         return self.calibration_file_path
 
+    def set_workers(self, workers: int):
+        """Set workers"""
+        if workers < 1:
+            raise ValueError("Number of workers must be a positive integer")
+        self.workers = workers
+
+    def get_workers(self) -> int:
+        """Get workers"""
+        return self.workers
+
     def set_ignore_corrupted(self, ignore_corrupted: str):
         """Set ignore"""
         self.ignore_corrupted = ignore_corrupted
@@ -195,6 +208,16 @@ class GlobalConfigurations:
             no_qr_code_timeout = 5
         return no_qr_code_timeout
 
+    def get_corrupted_frame_timeout(self) -> int:
+        """Get corrupted_frame_timeout, 0 when there is no limit"""
+        try:
+            corrupted_frame_timeout = int(
+                self.config["GENERAL"]["corrupted_frame_timeout"]
+            )
+        except KeyError:
+            corrupted_frame_timeout = 10
+        return max(corrupted_frame_timeout, 0)
+
     def get_search_qr_area_to(self) -> int:
         """Get search_qr_area_to"""
         try:
@@ -273,6 +296,50 @@ class GlobalConfigurations:
             enable_cropped_scan_for_pre_test_qr = False
         return enable_cropped_scan_for_pre_test_qr
 
+    def get_max_scan_image_height(self) -> int:
+        """Get max_scan_image_height, 0 when frames are scanned as recorded"""
+        try:
+            max_scan_image_height = int(self.config["GENERAL"]["max_scan_image_height"])
+        except KeyError:
+            max_scan_image_height = 0
+        return max_scan_image_height
+
+    def get_qr_scan_threads(self) -> int:
+        """Get qr_scan_threads, 0 to use all CPU threads of the process"""
+        try:
+            qr_scan_threads = int(self.config["GENERAL"]["qr_scan_threads"])
+        except KeyError:
+            qr_scan_threads = 4
+        return max(qr_scan_threads, 0)
+
+    def set_use_gpu_decode(self, use_gpu_decode: bool):
+        """Set use_gpu_decode"""
+        self.config["GENERAL"]["use_gpu_decode"] = str(use_gpu_decode)
+
+    def get_use_gpu_decode(self) -> bool:
+        """Get use_gpu_decode"""
+        try:
+            config_value = self.config["GENERAL"]["use_gpu_decode"]
+            if config_value == "True":
+                use_gpu_decode = True
+            else:
+                use_gpu_decode = False
+        except KeyError:
+            use_gpu_decode = False
+        return use_gpu_decode
+
+    def get_use_luma_plane_scan(self) -> bool:
+        """Get use_luma_plane_scan"""
+        try:
+            config_value = self.config["GENERAL"]["use_luma_plane_scan"]
+            if config_value == "True":
+                use_luma_plane_scan = True
+            else:
+                use_luma_plane_scan = False
+        except KeyError:
+            use_luma_plane_scan = False
+        return use_luma_plane_scan
+
     def get_tolerances(self) -> Dict[str, int]:
         """Get tolerances"""
         tolerances = {
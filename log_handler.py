@@ -22,13 +22,20 @@ License: Apache 2.0 https://www.apache.org/licenses/LICENSE-2.0.txt
 Licensor: Consumer Technology Association
 Contributor: Resillion UK Limited
 """
+import atexit
 import logging
+import os
+import queue
 from logging import FileHandler
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 MAX_LOGFILE_BYTES = 10 * 1024 * 1024
 BAK_LOG_FILE_NUM = 5
 
+PROGRESS = {"progress": True}
+"""extra of progress log records e.g. logger.info(..., extra=PROGRESS),
+progress is shown on the console but not written to the log files"""
+
 
 class LogColors:
     """ANSI escape codes for colors"""
@@ -69,14 +76,31 @@ class ColorFormatter(logging.Formatter):
         return super().format(record)
 
 
+class ProgressFilter(logging.Filter):
+    """Filter out progress log records, used on the log file handlers"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not getattr(record, "progress", False)
+
+
 class LogManager:
     """Log Manager class"""
 
     _logger_handler: FileHandler
     """log file handler"""
+    _console_handler: logging.StreamHandler
+    """console output handler"""
+    _queue_handler: QueueHandler
+    """root logger handler queuing log records for the listener"""
+    _listener: QueueListener
+    """background thread writing queued log records to the log file and console"""
+    _listener_running: bool
+    """whether the listener thread is running"""
 
     def __init__(self, log_file: str, loglevel: str, console_loglevel: str):
-        """Create logger handlers for the log files and the console output
+        """Create logger handlers for the log files and the console output.
+        Log records are queued and written on a background thread,
+        so that logging does not wait for file writes.
 
         Args:
             log_file (str): path to the logfile to use.
@@ -95,21 +119,57 @@ class LogManager:
         self._logger_handler = RotatingFileHandler(
             log_file, maxBytes=MAX_LOGFILE_BYTES, backupCount=BAK_LOG_FILE_NUM
         )
+        self._logger_handler.addFilter(ProgressFilter())
 
-        # send requested logging level and higher logging to a rotating logfile
-        logging.basicConfig(
-            handlers=[self._logger_handler],
-            level=numeric_level,
-            format="%(asctime)s %(name)-12s %(levelname)-8s %(message)s",
-            datefmt="%Y-%m-%d %H:%M",
+        self._logger_handler.setFormatter(
+            logging.Formatter(
+                fmt="%(asctime)s %(name)-12s %(levelname)-8s %(message)s",
+                datefmt="%Y-%m-%d %H:%M",
+            )
         )
 
         # define a Handler which writes INFO messages and higher to sys.stderr
-        console = logging.StreamHandler()
-        console.setLevel(numeric_level_console)
+        self._console_handler = logging.StreamHandler()
+        self._console_handler.setLevel(numeric_level_console)
         formatter = ColorFormatter("%(levelname)-8s %(message)s")
-        console.setFormatter(formatter)
-        logging.getLogger("").addHandler(console)
+        self._console_handler.setFormatter(formatter)
+
+        # send requested logging level and higher logging to the queue
+        self._queue_handler = QueueHandler(queue.SimpleQueue())
+        # records are formatted by the listener handlers
+        self._queue_handler.setFormatter(logging.Formatter("%(message)s"))
+        logging.basicConfig(handlers=[self._queue_handler], level=numeric_level)
+
+        self._listener = self._start_listener(
+            self._logger_handler, self._console_handler
+        )
+        atexit.register(self._stop_listener)
+        # forked worker processes have no listener thread, log directly instead
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._log_directly)
+
+    def _start_listener(self, *handlers: logging.Handler) -> QueueListener:
+        """Start writing queued log records to the handlers"""
+        listener = QueueListener(
+            self._queue_handler.queue, *handlers, respect_handler_level=True
+        )
+        listener.start()
+        self._listener_running = True
+        return listener
+
+    def _stop_listener(self) -> None:
+        """Write remaining queued log records and stop the listener"""
+        if self._listener_running:
+            self._listener.stop()
+            self._listener_running = False
+
+    def _log_directly(self) -> None:
+        """Replace the queue handler with the listener handlers"""
+        self._listener_running = False
+        root_logger = logging.getLogger("")
+        root_logger.removeHandler(self._queue_handler)
+        for handler in self._listener.handlers:
+            root_logger.addHandler(handler)
 
     def redirect_logfile(self, session_log_name: str):
         """redirect log file to <session-id>.log
@@ -117,12 +177,16 @@ class LogManager:
             session_log_name (str): path to the logfile to use.
         """
         file_handler = FileHandler(session_log_name)
+        file_handler.addFilter(ProgressFilter())
         formatter = ColorFormatter(
             fmt="%(asctime)s %(name)-12s %(levelname)-8s %(message)s",
             datefmt="%Y-%m-%d %H:%M",
         )
         file_handler.setFormatter(formatter)
-        logging.getLogger("").addHandler(file_handler)
-        logging.getLogger("").removeHandler(self._logger_handler)
+        # records queued so far are written to the previous log file
+        self._stop_listener()
         self._logger_handler.close()
         self._logger_handler = file_handler
+        self._listener = self._start_listener(
+            self._console_handler, self._logger_handler
+        )
@@ -25,18 +25,19 @@ Licensor: Consumer Technology Association
 Contributor: Resillion UK Limited
 """
 import argparse
+import atexit
 import errno
+import heapq
 import logging
-import math
 import os
 import shutil
+import stat
 import sys
 import traceback
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Tuple
 
-import cv2
-
 from dpctf_qr_decoder import (
     DPCTFQrDecoder,
     MezzanineDecodedQr,
@@ -45,10 +46,7 @@ from dpctf_qr_decoder import (
 )
 from exceptions import ConfigError, ObsFrameError, ObsFrameTerminate
 from global_configurations import GlobalConfigurations
-from log_handler import LogManager
-from observation_framework_processor import ObservationFrameworkProcessor
-from qr_recognition.qr_recognition import FrameAnalysis
-from camera_calibration_helper import calibrate_camera
+from log_handler import PROGRESS, LogManager
 
 MAJOR = 2
 MINOR = 0
@@ -65,6 +63,16 @@ QR code AREA (height and width) is 2 times bigger than its size
 camera might not be possible to be angles exact 90 degree to screen 
 this ratio set to slightly lower than 2"""
 
+AUDIO_FILE_EXTENSION = ".wav"
+"""extension of the audio file extracted from the recording"""
+
+PROGRESS_LOG_INTERVAL = 100
+"""progress is shown every this number of recording frames"""
+
+_io_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="file_io")
+"""background thread to rename recorded files after the analysis"""
+atexit.register(_io_pool.shutdown, wait=True)
+
 
 def rename_input_file(
     input_video_path_str: str, input_video_path: Path, session_token: str
@@ -79,20 +87,67 @@ def rename_input_file(
             new_file_path = os.path.join(
                 input_video_path.parent, new_file_name + file_extension
             )
-            os.rename(input_video_path_str, new_file_path)
+            os.replace(input_video_path_str, new_file_path)
 
             # rename generated audio file as well
-            audio_file_extension = ".wav"
-            input_audio_path_str = file_name + audio_file_extension
-            if os.path.exists(input_audio_path_str):
-                new_audio_file_name = file_name + "_dpctf_" + session_token
-                new_audio_file_path = os.path.join(
-                    input_video_path.parent, new_audio_file_name + audio_file_extension
-                )
-                os.rename(input_audio_path_str, new_audio_file_path)
+            input_audio_path_str = file_name + AUDIO_FILE_EXTENSION
+            new_audio_file_name = file_name + "_dpctf_" + session_token
+            new_audio_file_path = os.path.join(
+                input_video_path.parent, new_audio_file_name + AUDIO_FILE_EXTENSION
+            )
+            try:
+                os.replace(input_audio_path_str, new_audio_file_path)
+            except FileNotFoundError:
+                # audio is not extracted for this recording
+                pass
             logger.info("Recorded file renamed to '%s'.", new_file_path)
 
 
+def _log_rename_error(future: Future) -> None:
+    """Log error of a rename run on the background thread"""
+    exc = future.exception()
+    if exc is not None:
+        logger.warning("Failed to rename recorded file. %s", exc)
+
+
+def raise_invalid_video_error(input_video_path_str: str) -> None:
+    """Raise error for a recorded file that can not be read as a video.
+    The file is checked with a single stat call instead of opening it.
+    """
+    # raises FileNotFoundError when the file is missing
+    if os.stat(input_video_path_str).st_size == 0:
+        raise OSError(errno.EINVAL, "Video is empty")
+    # File exists but invalid.
+    raise OSError(errno.EINVAL, "Video is invalid")
+
+
+def merge_mezzanine_qr_code_area(qr_code_area: list, location: list) -> bool:
+    """Expand mezzanine qr code area in place to cover a detected QR code.
+
+    Args:
+        qr_code_area: [left, top, right, bottom] area, empty when not set yet
+        location: [left, top, width, height] of the detected QR code
+
+    Returns:
+        True when the area is big enough to contain all mezzanine QR codes
+    """
+    left, top, qr_width, qr_height = location
+    right = left + qr_width
+    bottom = top + qr_height
+    if not qr_code_area:
+        qr_code_area.extend([left, top, right, bottom])
+    else:
+        qr_code_area[0] = min(qr_code_area[0], left)
+        qr_code_area[1] = min(qr_code_area[1], top)
+        qr_code_area[2] = max(qr_code_area[2], right)
+        qr_code_area[3] = max(qr_code_area[3], bottom)
+
+    return (
+        qr_code_area[2] - qr_code_area[0] > QR_CODE_AREA_RATIO_TO_SIZE * qr_width
+        and qr_code_area[3] - qr_code_area[1] > QR_CODE_AREA_RATIO_TO_SIZE * qr_height
+    )
+
+
 def iter_to_get_qr_area(
     vid_cap,
     camera_frame_rate: float,
@@ -117,88 +172,107 @@ def iter_to_get_qr_area(
         first_pre_test_qr_time: first pre test qr code detection time in ms
         qr_code_areas: qr_code_areas to crop when detecting qr code
     """
+    # cv2 and QR code scanning modules are imported when the analysis runs,
+    # so that the command line help starts without loading them
+    import cv2
+    from qr_recognition.qr_recognition import FrameAnalysis
+    from video_capture_handler import get_max_corrupted_frame_num
+
     test_status_found = False
     mezzanine_found = False
-    first_pre_test_found = False
     first_pre_test_qr_time = 0
     qr_code_areas = [[], []]
     corrupted_frame_num = 0
-    vid_cap.set(cv2.CAP_PROP_POS_MSEC, starting_point_s * 1000)
+    consecutive_corrupted_frame_num = 0
+    ignore_corrupted_video = "video" in global_configurations.get_ignore_corrupted()
+    max_corrupted_frame_num = get_max_corrupted_frame_num(
+        camera_frame_rate, global_configurations
+    )
+    if starting_point_s > 0:
+        vid_cap.set(cv2.CAP_PROP_POS_MSEC, starting_point_s * 1000)
     len_frames = int(vid_cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    starting_frame = math.floor(starting_point_s * camera_frame_rate)
+    starting_frame = int(starting_point_s * camera_frame_rate)
     capture_frame_num = starting_frame
+    # first pre-test QR code is only looked for when search starts from the beginning
+    need_pre_test = starting_frame == 0
+    decoder = DPCTFQrDecoder()
+    debug_enabled = logger.isEnabledFor(logging.DEBUG)
+    # frame number where the progress is shown next
+    next_progress_frame_num = (
+        -(-starting_frame // PROGRESS_LOG_INTERVAL) * PROGRESS_LOG_INTERVAL
+    )
+
+    half_width = width // 2
+    rough_qr_code_areas = [
+        # left half for mezzanine
+        [0, 0, half_width, height],
+        # right half for test status
+        [half_width, 0, width, height],
+    ]
+    # middle strip for pre-test, only until the first pre-test QR code is found
+    pre_test_rough_qr_code_areas = rough_qr_code_areas
+    if global_configurations.get_enable_cropped_scan_for_pre_test_qr():
+        pre_test_rough_qr_code_areas = rough_qr_code_areas + [
+            [width // 4, 0, int((width / 4) * 3), height]
+        ]
+
+    # frame and grayscale image buffers reused across frames
+    image = None
+    image_buffer = None
+    analysis = FrameAnalysis(capture_frame_num, decoder, max_qr_code_num_in_frame=3)
 
     while (len_frames + corrupted_frame_num) > capture_frame_num:
-        got_frame, image = vid_cap.read()
+        got_frame, image = vid_cap.read(image)
         if not got_frame:
-            if "video" in global_configurations.get_ignore_corrupted():
+            if ignore_corrupted_video and (
+                max_corrupted_frame_num == 0
+                or consecutive_corrupted_frame_num < max_corrupted_frame_num
+            ):
                 # work around for camera has corrupted frame e.g.:GoPro
                 corrupted_frame_num += 1
+                consecutive_corrupted_frame_num += 1
                 capture_frame_num += 1
                 continue
             else:
                 logger.warning("Recording frame %d is corrupted.", capture_frame_num)
                 break
+        consecutive_corrupted_frame_num = 0
+
+        # show where the processing is currently
+        if capture_frame_num >= next_progress_frame_num:
+            logger.info("Checking frame %d...", capture_frame_num, extra=PROGRESS)
+            next_progress_frame_num = (
+                capture_frame_num
+                - capture_frame_num % PROGRESS_LOG_INTERVAL
+                + PROGRESS_LOG_INTERVAL
+            )
 
-        # print out where the processing is currently
-        if capture_frame_num % 10 == 0:
-            print(f"Checking frame {capture_frame_num}...")
-
-        analysis = FrameAnalysis(
-            capture_frame_num, DPCTFQrDecoder(), max_qr_code_num_in_frame=3
+        analysis.reset(capture_frame_num)
+        image_buffer = analysis.full_scan(
+            image,
+            pre_test_rough_qr_code_areas if need_pre_test else rough_qr_code_areas,
+            do_adaptive_threshold_scan,
+            image_buffer,
         )
-
-        rough_qr_code_areas = [[], []]
-        # left half for mezzanine
-        rough_qr_code_areas[0] = [0, 0, int(width / 2), height]
-        # right half for test status
-        rough_qr_code_areas[1] = [int(width / 2), 0, width, height]
-
-        analysis.full_scan(image, rough_qr_code_areas, do_adaptive_threshold_scan)
         detected_qr_codes = analysis.all_codes()
 
         for detected_code in detected_qr_codes:
-            if (
-                isinstance(detected_code, PreTestDecodedQr)
-                and not first_pre_test_found
-                and starting_frame == 0
-            ):
+            if isinstance(detected_code, PreTestDecodedQr) and need_pre_test:
                 first_pre_test_qr_time = capture_frame_num / camera_frame_rate * 1000
-                first_pre_test_found = True
+                need_pre_test = False
                 logger.debug(
                     "First pre-test QR code is detected at time %f.",
                     first_pre_test_qr_time,
                 )
             elif isinstance(detected_code, MezzanineDecodedQr) and not mezzanine_found:
-                logger.debug(
-                    "Frame Number=%d Location=%s",
-                    detected_code.frame_number,
-                    detected_code.location,
-                )
-                new_qr_code_area = [
-                    detected_code.location[0],
-                    detected_code.location[1],
-                    detected_code.location[0] + detected_code.location[2],
-                    detected_code.location[1] + detected_code.location[3],
-                ]
-                if not qr_code_areas[0]:
-                    qr_code_areas[0] = new_qr_code_area
-                else:
-                    if new_qr_code_area[0] < qr_code_areas[0][0]:
-                        qr_code_areas[0][0] = new_qr_code_area[0]
-                    if new_qr_code_area[1] < qr_code_areas[0][1]:
-                        qr_code_areas[0][1] = new_qr_code_area[1]
-                    if new_qr_code_area[2] > qr_code_areas[0][2]:
-                        qr_code_areas[0][2] = new_qr_code_area[2]
-                    if new_qr_code_area[3] > qr_code_areas[0][3]:
-                        qr_code_areas[0][3] = new_qr_code_area[3]
-
-                if (
-                    (qr_code_areas[0][2] - qr_code_areas[0][0])
-                    > QR_CODE_AREA_RATIO_TO_SIZE * detected_code.location[2]
-                ) and (
-                    (qr_code_areas[0][3] - qr_code_areas[0][1])
-                    > QR_CODE_AREA_RATIO_TO_SIZE * detected_code.location[3]
+                if debug_enabled:
+                    logger.debug(
+                        "Frame Number=%d Location=%s",
+                        detected_code.frame_number,
+                        detected_code.location,
+                    )
+                if merge_mezzanine_qr_code_area(
+                    qr_code_areas[0], detected_code.location
                 ):
                     mezzanine_found = True
                     logger.debug(
@@ -209,11 +283,12 @@ def iter_to_get_qr_area(
             elif (
                 isinstance(detected_code, TestStatusDecodedQr) and not test_status_found
             ):
-                logger.debug(
-                    "Status=%s Location=%s",
-                    detected_code.status,
-                    detected_code.location,
-                )
+                if debug_enabled:
+                    logger.debug(
+                        "Status=%s Location=%s",
+                        detected_code.status,
+                        detected_code.location,
+                    )
                 qr_code_areas[1] = [
                     detected_code.location[0],
                     detected_code.location[1],
@@ -228,6 +303,10 @@ def iter_to_get_qr_area(
             else:
                 continue
 
+            # remaining codes on this frame are not needed once everything is found
+            if test_status_found and mezzanine_found and not need_pre_test:
+                break
+
         capture_frame_num += 1
 
         # finish when both mezzanine and test status area found
@@ -276,6 +355,8 @@ def get_qr_code_area(
         qr_code_areas: qr_code_areas to crop when detecting qr code
         pre_test_qr_code_area: qr_code_area to crop for pre test qr code
     """
+    from video_capture_handler import VideoProperties, open_video_capture
+
     logger.info("Search '%s' to get QR code location...", input_video_path_str)
 
     qr_code_areas = [[], []]
@@ -287,29 +368,38 @@ def get_qr_code_area(
     # read user input range parameter
     qr_search_range = global_configurations.get_qr_search_range()
 
-    input_video_path = Path(input_video_path_str).resolve()
-    if not input_video_path.is_file():
+    # single stat call to check the recorded file exists
+    try:
+        is_file = stat.S_ISREG(os.stat(input_video_path_str).st_mode)
+    except FileNotFoundError:
+        is_file = False
+    if not is_file:
+        input_video_path = Path(input_video_path_str).resolve()
         raise Exception(f"Recorded file '{input_video_path}' not found")
 
-    vid_cap = cv2.VideoCapture(input_video_path_str)
-    fps: float = vid_cap.get(cv2.CAP_PROP_FPS)
-    width: int = int(vid_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height: int = int(vid_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    duration = int(vid_cap.get(cv2.CAP_PROP_FRAME_COUNT)) / fps
+    # the search seeks to the starting point of the range parameter
+    vid_cap = open_video_capture(
+        input_video_path_str,
+        global_configurations,
+        seekable=bool(qr_search_range) and qr_search_range[1] > 0,
+    )
+    video_properties = VideoProperties(vid_cap)
+    fps = video_properties.fps
+    width = video_properties.width
+    height = video_properties.height
 
     # if user input range parameter defined then update defaults
     if qr_search_range:
         starting_point_s = qr_search_range[1]
         qr_code_search_duration = qr_search_range[2]
-        if starting_point_s > duration:
+        if starting_point_s > video_properties.frame_count / fps:
+            vid_cap.release()
             raise ValueError("Starting point larger than recording duration.")
         search_qr_area_to = starting_point_s + qr_code_search_duration
 
-    if fps < 1 or width <= 0 or height <= 0:
+    if not video_properties.is_valid():
         vid_cap.release()
-        open(input_video_path_str, "rb")
-        # File is readable but invalid.
-        raise OSError(errno.EINVAL, "Video is invalid")
+        raise_invalid_video_error(input_video_path_str)
 
     if search_qr_area_to != 0:
         try:
@@ -345,7 +435,7 @@ def get_qr_code_area(
             if qr_code_areas[i][2] > width:
                 qr_code_areas[i][2] = width
             if qr_code_areas[i][3] > height:
-                qr_code_areas[i][2] = height
+                qr_code_areas[i][3] = height
         else:
             # when qr_code_areas can not be detected
             if i == 0:
@@ -363,11 +453,45 @@ def get_qr_code_area(
                     "right half of image for test status QR code."
                 )
 
+    # cropping areas must be non-empty and inside the image
+    for x0, y0, x1, y1 in qr_code_areas:
+        assert 0 <= x0 < x1 <= width and 0 <= y0 < y1 <= height, (
+            f"QR code area [{x0}, {y0}, {x1}, {y1}] is not inside "
+            f"the {width}x{height} image"
+        )
+
     pre_test_qr_code_area = [int(width / 4), 0, int((width / 4) * 3), height]
 
     return first_pre_test_qr_time, qr_code_areas, pre_test_qr_code_area
 
 
+def submit_qr_code_scans(
+    scan_executor: ProcessPoolExecutor,
+    input_video_path_str: str,
+    qr_code_areas: list,
+    do_adaptive_threshold_scan: bool,
+    global_configurations: GlobalConfigurations,
+) -> Future:
+    """Submit QR code scan of a whole recording to the worker processes.
+    Recordings are not split into frame intervals, as seeking to a frame
+    is not frame accurate with the OpenCV FFmpeg backend.
+    The recording properties are returned by the worker, as read from
+    the video capture the recording is scanned with.
+
+    Returns:
+        scan_future: future of the recording (video_properties, scanned_qr_codes)
+    """
+    from observation_framework_processor import scan_qr_codes_in_video
+
+    return scan_executor.submit(
+        scan_qr_codes_in_video,
+        input_video_path_str,
+        qr_code_areas,
+        do_adaptive_threshold_scan,
+        global_configurations,
+    )
+
+
 def run(
     input_video_files: List[str],
     log_manager: LogManager,
@@ -378,7 +502,21 @@ def run(
     Calibrate camera and set camera calibration offset when calibration_file_path is given.
     Runs the observation framework process.
     """
+    import cv2
+    from camera_calibration_helper import calibrate_camera
+    from observation_framework_processor import ObservationFrameworkProcessor
+    from video_capture_handler import (
+        ThreadedVideoCapture,
+        VideoProperties,
+        configure_opencv_threads,
+        open_video_capture,
+    )
+
     logger.info("Device Observation Framework (V%s) analysis started!", VERSION)
+    configure_opencv_threads(global_configurations)
+    # shows whether OpenCV is built with parallel framework, IPP and FFmpeg
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("OpenCV build information:%s", cv2.getBuildInformation())
     calibration_offset = 0
     calibration_file_path = global_configurations.get_calibration_file_path()
     if calibration_file_path:
@@ -408,11 +546,7 @@ def run(
     if do_adaptive_threshold_scan:
         logger.info("Intensive QR code scanning with an additional adaptiveThreshold.")
 
-    (
-        _first_pre_test_qr_time,
-        qr_code_areas,
-        pre_test_qr_code_area,
-    ) = get_qr_code_area(
+    _first_pre_test_qr_time, qr_code_areas, pre_test_qr_code_area = get_qr_code_area(
         input_video_files[file_index], global_configurations, do_adaptive_threshold_scan
     )
     logger.info(
@@ -431,53 +565,98 @@ def run(
             "%s for pre-test QR code is enabled.",
             qr_code_areas[2],
         )
-    for i in range(0, len(input_video_files)):
-        input_video_path_str = input_video_files[i]
-        logger.info("Analysing recording '%s'.", input_video_path_str)
-
-        input_video_path = Path(input_video_path_str).resolve()
-        if not input_video_path.is_file():
-            raise Exception(f"Recorded file '{input_video_path}' not found")
+    # scan QR codes of the next recordings in worker processes ahead of processing
+    # scanned QR codes are then processed recording by recording in order
+    scan_executor = None
+    # {file index: scan_future} of the recordings submitted to scan
+    file_scans = {}
+    workers = global_configurations.get_workers()
+    if workers > 1:
+        logger.info("Scanning QR codes with %d worker processes.", workers)
+        scan_executor = ProcessPoolExecutor(max_workers=workers)
 
-        vid_cap = cv2.VideoCapture(input_video_path_str)
-        fps: float = vid_cap.get(cv2.CAP_PROP_FPS)
-        width: int = int(vid_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height: int = int(vid_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-        if fps < 1 or width <= 0 or height <= 0:
-            vid_cap.release()
-            open(input_video_path_str, "rb")
-            # File is readable but invalid.
-            raise OSError(errno.EINVAL, "Video is invalid")
-
-        try:
-            if observation_framework is None:
-                observation_framework = ObservationFrameworkProcessor(
-                    calibration_offset,
-                    log_manager,
-                    global_configurations,
-                    fps,
-                    do_adaptive_threshold_scan,
+    try:
+        # input files are already resolved and checked by process_input_video_files
+        for i, input_video_path_str in enumerate(input_video_files):
+            logger.info("Analysing recording '%s'.", input_video_path_str)
+
+            vid_cap = None
+            if scan_executor is not None:
+                # scanned QR codes are kept in memory until they are processed
+                # so only one recording for each worker is scanned ahead
+                for j in range(i, min(i + workers + 1, len(input_video_files))):
+                    if j not in file_scans:
+                        file_scans[j] = submit_qr_code_scans(
+                            scan_executor,
+                            input_video_files[j],
+                            qr_code_areas,
+                            do_adaptive_threshold_scan,
+                            global_configurations,
+                        )
+                video_properties, scanned_qr_codes = file_scans.pop(i).result()
+            else:
+                vid_cap = open_video_capture(
+                    input_video_path_str, global_configurations
                 )
+                video_properties = VideoProperties(vid_cap)
+
+            fps = video_properties.fps
+            if not video_properties.is_valid():
+                if vid_cap is not None:
+                    vid_cap.release()
+                raise_invalid_video_error(input_video_path_str)
+
+            try:
+                if observation_framework is None:
+                    observation_framework = ObservationFrameworkProcessor(
+                        calibration_offset,
+                        log_manager,
+                        global_configurations,
+                        fps,
+                        do_adaptive_threshold_scan,
+                    )
 
-            observation_framework.extract_audio(
-                input_video_path_str, starting_camera_frame_number
-            )
+                observation_framework.extract_audio(
+                    input_video_path_str, starting_camera_frame_number
+                )
 
-            last_camera_frame_number = observation_framework.iter_qr_codes_in_video(
-                vid_cap, starting_camera_frame_number, qr_code_areas
-            )
-            starting_camera_frame_number += last_camera_frame_number
-        finally:
-            vid_cap.release()
+                if vid_cap is None:
+                    last_camera_frame_number = (
+                        observation_framework.iter_scanned_qr_codes(
+                            scanned_qr_codes, starting_camera_frame_number
+                        )
+                    )
+                else:
+                    # decode next frames while the current frames are scanned
+                    vid_cap = ThreadedVideoCapture(
+                        vid_cap,
+                        kept_frame_num=observation_framework.max_pending_scan_num,
+                    )
+                    last_camera_frame_number = (
+                        observation_framework.iter_qr_codes_in_video(
+                            vid_cap, starting_camera_frame_number, qr_code_areas
+                        )
+                    )
+                starting_camera_frame_number += last_camera_frame_number
+            finally:
+                if vid_cap is not None:
+                    vid_cap.release()
+    finally:
+        if observation_framework is not None:
+            observation_framework.close()
+        if scan_executor is not None:
+            scan_executor.shutdown(cancel_futures=True)
 
     if observation_framework:
+        # renamed in background, the files are not used after the analysis
+        # atexit waits for the renames to finish before exiting
         for input_video_path_str in input_video_files:
-            rename_input_file(
+            _io_pool.submit(
+                rename_input_file,
                 input_video_path_str,
-                input_video_path,
+                Path(input_video_path_str),
                 observation_framework.pre_test_qr_code.session_token,
-            )
+            ).add_done_callback(_log_rename_error)
 
     logger.info("The Device Observation Framework analysis has ended.")
 
@@ -489,16 +668,24 @@ def clear_path(file_path: str, session_log_threshold: int) -> None:
     delete some file to release the disk space
     """
     if os.path.isdir(file_path):
-        full_path = [
-            os.path.join(file_path, f)
-            for f in os.listdir(file_path)
-            if os.path.isdir(os.path.join(file_path, f))
-        ]
-        num_session = len(full_path)
+        # (ctime, path) collected in one pass, DirEntry caches the stat result
+        with os.scandir(file_path) as entries:
+            session_entries = [
+                (entry.stat().st_ctime, entry.path)
+                for entry in entries
+                if entry.is_dir()
+            ]
+        num_session = len(session_entries)
 
         num_of_session_to_delete = num_session - session_log_threshold
         if num_of_session_to_delete > 0:
-            oldest = sorted(full_path, key=os.path.getctime)[0:num_of_session_to_delete]
+            # only the oldest sessions are needed, no need to sort all of them
+            oldest = [
+                session_path
+                for _ctime, session_path in heapq.nsmallest(
+                    num_of_session_to_delete, session_entries
+                )
+            ]
             logger.info(
                 "Removing oldest %d file(s): %s!", num_of_session_to_delete, oldest
             )
@@ -540,32 +727,35 @@ def process_input_video_files(
     process input video files from input file string
     and return input video file path in a list
     """
-    input_video_files = []
     input_video_path = Path(input_str).resolve()
 
     if not os.path.isabs(input_video_path):
         input_video_path = os.path.abspath(input_video_path)
 
     if input_video_path.is_dir():
-        input_files = os.listdir(input_video_path)
-        for input_file in input_files:
-            # skip audio files
-            if ".wav" in input_file:
-                continue
-            full_path = os.path.join(input_video_path, input_file)
-            if Path(full_path).resolve().is_file():
-                input_video_files.append(full_path)
-            else:
-                logger.warning("%s is not a file, skipped!", full_path)
+        # collect (modified time, path) in one pass over the directory
+        # DirEntry caches the stat result so no second stat call is needed to sort
+        input_file_entries = []
+        with os.scandir(input_video_path) as entries:
+            for entry in entries:
+                # skip audio files
+                if entry.name.lower().endswith(AUDIO_FILE_EXTENSION):
+                    continue
+                # is_file() follows symlinks and reuses the DirEntry information
+                if entry.is_file():
+                    input_file_entries.append((entry.stat().st_mtime, entry.path))
+                else:
+                    logger.warning("%s is not a file, skipped!", entry.path)
     else:
-        input_video_files.append(str(input_video_path))
+        input_file_entries = [(0, str(input_video_path))]
 
     # sort input files based on the configuration
     sort_input_files_by = global_configurations.get_sort_input_files_by()
     if sort_input_files_by == "filename":
-        sorted(input_video_files)
+        input_file_entries.sort(key=lambda input_file_entry: input_file_entry[1])
     else:
-        input_video_files.sort(key=os.path.getmtime)
+        input_file_entries.sort()
+    input_video_files = [full_path for _mtime, full_path in input_file_entries]
     return input_video_files
 
 
@@ -649,6 +839,19 @@ def main() -> None:
     parser.add_argument(
         "--calibration", help="Camera calibration recording file path.", default=""
     )
+    parser.add_argument(
+        "--gpu",
+        help="Decode recordings on GPU when OpenCV is built with CUDA video decoding, "
+        "or with FFmpeg hardware decoding otherwise.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--workers",
+        help="Number of worker processes to scan QR codes in parallel. "
+        "Each worker scans a whole recording file.",
+        type=int,
+        default=1,
+    )
 
     args = parser.parse_args()
     do_adaptive_threshold_scan = False
@@ -660,6 +863,9 @@ def main() -> None:
     global_configurations.set_system_mode(args.mode)
     global_configurations.set_qr_search_range(args.range)
     global_configurations.set_calibration_file_path(args.calibration)
+    global_configurations.set_workers(args.workers)
+    if args.gpu:
+        global_configurations.set_use_gpu_decode(True)
 
     log_file_path = global_configurations.get_log_file_path()
     log_file = log_file_path + "/events.log"
@@ -26,11 +26,16 @@ License: Apache 2.0 https://www.apache.org/licenses/LICENSE-2.0.txt
 Licensor: Consumer Technology Association
 Contributor: Resillion UK Limited
 """
+import csv
 import importlib
 import json
 import logging
 import os
-from typing import List, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from operator import add, attrgetter
+from typing import Any, List, Optional, TextIO, Tuple
 
 import cv2
 
@@ -44,18 +49,43 @@ from dpctf_qr_decoder import (
 )
 from exceptions import ConfigError, ObsFrameTerminate
 from global_configurations import GlobalConfigurations
-from log_handler import LogManager
+from log_handler import PROGRESS, LogManager
 from observation_result_handler import ObservationResultHandler
 from output_file_handler import extract_qr_data_to_csv, write_header_to_csv_file
 from qr_recognition.qr_decoder import DecodedQr
-from qr_recognition.qr_recognition import FrameAnalysis
+from qr_recognition.qr_recognition import (
+    FrameAnalysis,
+    copy_gray_image,
+    get_scan_areas,
+    get_scan_scale,
+)
 from observations.observation import Observation
+from video_capture_handler import (
+    ThreadedVideoCapture,
+    VideoProperties,
+    configure_opencv_threads,
+    get_max_corrupted_frame_num,
+    get_worker_thread_num,
+    open_video_capture,
+)
 
 logger = logging.getLogger(__name__)
 
 # test finish delay in ms after 1st status "finished" status
 TEST_FINISH_DELAY = 2000
 
+# progress is shown every this number of camera frames
+PROGRESS_LOG_INTERVAL = 100
+
+
+def get_timeout_frame_num(timeout: int, frame_rate: float) -> int:
+    """Get the smallest number of frames passed that exceeds the timeout in seconds,
+    when the passed time is rounded to seconds as in check_timeout()"""
+    frame_num = int((timeout + 0.5) * frame_rate) - 1
+    while round(frame_num / frame_rate) <= timeout:
+        frame_num += 1
+    return frame_num
+
 
 class ObservationFrameworkProcessor:
     """Class to handle observation process"""
@@ -74,6 +104,8 @@ class ObservationFrameworkProcessor:
 
     tests: dict
     """tests codes dictionary to map test code with module and class"""
+    test_classes: dict
+    """test classes already imported for each test code"""
 
     last_end_of_test_camera_frame_num: int
     """recording frame number of the last finished event to check the end of session timeout"""
@@ -81,6 +113,8 @@ class ObservationFrameworkProcessor:
     """end of session timeout
     when the gap is bigger that this, assume end of session is reached
     process stops and discard following recordings"""
+    end_of_session_timeout_frame_num: int
+    """end_of_session_timeout in number of camera frames"""
 
     no_qr_code_frame_num: int
     """recording frame number of the no QR code detected to check the end of session timeout"""
@@ -88,6 +122,8 @@ class ObservationFrameworkProcessor:
     """no qr code timeout
     when the gap is bigger that this assume end of session is reached
     process stops and discard following recordings"""
+    no_qr_code_timeout_frame_num: int
+    """no_qr_code_timeout in number of camera frames"""
 
     decoder: DPCTFQrDecoder
     """WAVE DPCTF QR code decoder to handle QR code translation"""
@@ -121,16 +157,29 @@ class ObservationFrameworkProcessor:
     """recording frame rate"""
     camera_frame_duration_ms: float
     """camera frame duration in ms based on captured frame rate"""
+    pre_session_scan_interval: int
+    """scan every this number of camera frames until the session is identified
+    the pre-test QR code is shown for a while before each test starts"""
+    qr_scan_thread_num: int
+    """number of threads scanning QR codes of consecutive frames"""
+    max_pending_scan_num: int
+    """maximum number of frames being scanned ahead of processing"""
 
     session_log_path: str
     """session log folder path"""
     qr_list_file: str
     """decoded qr code csv file path"""
+    qr_list_file_handle: Optional[TextIO]
+    """decoded qr code csv file kept open for the session, None when not written"""
+    qr_list_writer: Any
+    """csv writer of the decoded qr code csv file, None when not written"""
     observation_data_export_file: str
     """time difference csv file path"""
 
     consecutive_no_qr_threshold: int
     """Consecutive no mezzanine qr code camera frame threshold"""
+    consecutive_no_qr_thresholds: dict
+    """consecutive_no_qr_threshold calculated for each mezzanine frame rate"""
     consecutive_no_qr_count: int
     """count of consecutive no qr code, stop counter when no  qr is detected
     stop counter when mezzanine qr is detected at any time"""
@@ -161,6 +210,7 @@ class ObservationFrameworkProcessor:
         """
         with open("of_testname_map.json", encoding="utf-8") as f:
             self.tests = json.load(f)
+        self.test_classes = {}
 
         self.calibration_offset = calibration_offset
         self.log_manager = log_manager
@@ -180,6 +230,11 @@ class ObservationFrameworkProcessor:
         self.duplicated_qr_check_count = (
             global_configurations.get_duplicated_qr_check_count()
         )
+        self.qr_scan_thread_num = global_configurations.get_qr_scan_threads()
+        if not self.qr_scan_thread_num:
+            self.qr_scan_thread_num = get_worker_thread_num(global_configurations)
+        # keep every thread busy while the oldest scan is processed
+        self.max_pending_scan_num = self.qr_scan_thread_num * 2
 
         self.mezzanine_qr_codes = []
         self.test_status_qr_codes = []
@@ -190,12 +245,22 @@ class ObservationFrameworkProcessor:
 
         self.camera_frame_rate = fps
         self.camera_frame_duration_ms = 1000 / fps
+        self.end_of_session_timeout_frame_num = get_timeout_frame_num(
+            self.end_of_session_timeout, fps
+        )
+        self.no_qr_code_timeout_frame_num = get_timeout_frame_num(
+            self.no_qr_code_timeout, fps
+        )
+        self.pre_session_scan_interval = max(int(fps / 2), 1)
 
         self.session_log_path = ""
         self.qr_list_file = ""
+        self.qr_list_file_handle = None
+        self.qr_list_writer = None
         self.observation_data_export_file = ""
 
         self.consecutive_no_qr_threshold = 0
+        self.consecutive_no_qr_thresholds = {}
         self.consecutive_no_qr_count = 0
         self.first_qr_is_detected = False
         self.test_started = False
@@ -224,6 +289,10 @@ class ObservationFrameworkProcessor:
         sort by frame number if content not changed,
         else same content appended first.
         """
+        # nothing to sort for a single QR code
+        if len(new_mezzanine_qr_codes) <= 1:
+            return new_mezzanine_qr_codes
+
         if self.mezzanine_qr_codes:
             last_qr_code_id = self.mezzanine_qr_codes[-1].content_id
         else:
@@ -242,14 +311,8 @@ class ObservationFrameworkProcessor:
                 else:
                     mezzanine_2.append(code)
 
-        mezzanine_1 = sorted(
-            mezzanine_1,
-            key=lambda mezzanine_decoded_qr: mezzanine_decoded_qr.frame_number,
-        )
-        mezzanine_2 = sorted(
-            mezzanine_2,
-            key=lambda mezzanine_decoded_qr: mezzanine_decoded_qr.frame_number,
-        )
+        mezzanine_1.sort(key=attrgetter("frame_number"))
+        mezzanine_2.sort(key=attrgetter("frame_number"))
         sorted_new_mezzanine = mezzanine_1 + mezzanine_2
 
         return sorted_new_mezzanine
@@ -264,52 +327,50 @@ class ObservationFrameworkProcessor:
         new_pre_test_qr_code = None
 
         for detected_code in detected_codes:
-            if isinstance(detected_code, MezzanineDecodedQr):
-                check_back_count = 0
+            # QR code types are not subclassed, compare the exact type
+            code_type = type(detected_code)
+            if code_type is MezzanineDecodedQr:
                 duplicated = False
-                for qr_code in self.mezzanine_qr_codes[::-1]:
-                    check_back_count += 1
-                    if check_back_count > self.duplicated_qr_check_count:
-                        # add to list even duplicated frame
-                        # duplicated frame normally check back for duplicated_qr_check_count
-                        # default value is 3 because we have only 4 QR code position
-                        break
+                # add to list even duplicated frame
+                # duplicated frame normally check back for duplicated_qr_check_count
+                # default value is 3 because we have only 4 QR code position
+                for qr_code in islice(
+                    reversed(self.mezzanine_qr_codes), self.duplicated_qr_check_count
+                ):
                     if qr_code == detected_code:
                         duplicated = True
                         # update last appear frame number
-                        index = self.mezzanine_qr_codes.index(qr_code)
-                        self.mezzanine_qr_codes[index].last_camera_frame_num = (
+                        qr_code.last_camera_frame_num = (
                             detected_code.first_camera_frame_num
                         )
 
                         # adds up location values
-                        self.mezzanine_qr_codes[index].location = [
-                            self.mezzanine_qr_codes[index].location[x]
-                            + detected_code.location[x]
-                            for x in range(len(detected_code.location))
-                        ]
+                        qr_code.location = list(
+                            map(add, qr_code.location, detected_code.location)
+                        )
 
                         # increment detection count
-                        self.mezzanine_qr_codes[index].detection_count += 1
-
-                        logger.debug(
-                            "Frame Number=%d Last Frame=%d Location sum=%s Detection count=%d.",
-                            self.mezzanine_qr_codes[index].frame_number,
-                            self.mezzanine_qr_codes[index].last_camera_frame_num,
-                            self.mezzanine_qr_codes[index].location,
-                            self.mezzanine_qr_codes[index].detection_count,
-                        )
+                        qr_code.detection_count += 1
+
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug(
+                                "Frame Number=%d Last Frame=%d Location sum=%s Detection count=%d.",
+                                qr_code.frame_number,
+                                qr_code.last_camera_frame_num,
+                                qr_code.location,
+                                qr_code.detection_count,
+                            )
                         break
                 if not duplicated:
                     new_mezzanine_qr_codes.append(detected_code)
 
-            elif isinstance(detected_code, TestStatusDecodedQr):
+            elif code_type is TestStatusDecodedQr:
                 if not self.test_status_qr_codes:
                     new_test_status_qr_code = detected_code
                 elif self.test_status_qr_codes[-1] != detected_code:
                     new_test_status_qr_code = detected_code
 
-            elif isinstance(detected_code, PreTestDecodedQr):
+            elif code_type is PreTestDecodedQr:
                 if self.pre_test_qr_code != detected_code:
                     new_pre_test_qr_code = detected_code
                 else:
@@ -318,12 +379,13 @@ class ObservationFrameworkProcessor:
                         detected_code.first_camera_frame_num
                     )
                 # discard all QR codes that are detected at the same time with PreTestDecodedQr
-                for log_code in detected_codes:
-                    if not isinstance(log_code, PreTestDecodedQr):
-                        logger.debug(
-                            "Discarded QR code %s detected simultaneously with Pre-Test QR code.",
-                            log_code.data,
-                        )
+                if logger.isEnabledFor(logging.DEBUG):
+                    for log_code in detected_codes:
+                        if type(log_code) is not PreTestDecodedQr:
+                            logger.debug(
+                                "Discarded QR code %s detected simultaneously with Pre-Test QR code.",
+                                log_code.data,
+                            )
                 return [], None, new_pre_test_qr_code
 
             else:
@@ -348,17 +410,20 @@ class ObservationFrameworkProcessor:
         logger.info("Start a New test: %s", self.test_path)
 
         if self.session_log_path:
+            test_file_name = self.test_path.replace("/", "-").replace(".html", "")
             self.observation_data_export_file = (
-                self.session_log_path
-                + "/"
-                + self.test_path.replace("/", "-").replace(".html", "")
+                f"{self.session_log_path}/{test_file_name}"
             )
 
         try:
-            module_name = self.tests[test_code][0]
-            class_name = self.tests[test_code][1]
-            test_module = importlib.import_module("test_code." + module_name)
-            self.test_class = getattr(test_module, class_name)(
+            test_class = self.test_classes.get(test_code)
+            if test_class is None:
+                module_name = self.tests[test_code][0]
+                class_name = self.tests[test_code][1]
+                test_module = importlib.import_module(f"test_code.{module_name}")
+                test_class = getattr(test_module, class_name)
+                self.test_classes[test_code] = test_class
+            self.test_class = test_class(
                 self.configuration_parser,
                 self.global_configurations,
                 self.test_path,
@@ -505,19 +570,19 @@ class ObservationFrameworkProcessor:
         if not self.results:
             self.results = results
         else:
+            results_by_name = {result["name"]: result for result in self.results}
             for new_result in results:
-                for result in self.results:
-                    if new_result["name"] == result["name"]:
-                        result["message"] = result["message"] + new_result["message"]
-                        if (
-                            new_result["status"] == "PASS"
-                            and result["status"] == "PASS"
-                        ):
-                            result["status"] = "PASS"
-                        else:
-                            result["status"] = new_result["status"]
-                    else:
-                        self.results.append(new_result)
+                result = results_by_name.get(new_result["name"])
+                if result is None:
+                    self.results.append(new_result)
+                    results_by_name[new_result["name"]] = new_result
+                    continue
+
+                result["message"] = result["message"] + new_result["message"]
+                if new_result["status"] == "PASS" and result["status"] == "PASS":
+                    result["status"] = "PASS"
+                else:
+                    result["status"] = new_result["status"]
 
     def _post_observation_result(self) -> None:
         """Post observation result to test runner"""
@@ -531,13 +596,15 @@ class ObservationFrameworkProcessor:
     ) -> None:
         """Process newly detected Mezzanine content QR code"""
         self.mezzanine_qr_codes.extend(new_mezzanine_qr_codes)
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
         for new_code in new_mezzanine_qr_codes:
             logger.debug(
                 "Content ID=%s Media Time=%f Frame Number=%d Frame Rate=%s Captured on Frame=%d",
                 new_code.content_id,
                 new_code.media_time,
                 new_code.frame_number,
-                str(new_code.frame_rate),
+                new_code.frame_rate,
                 new_code.first_camera_frame_num,
             )
 
@@ -564,36 +631,28 @@ class ObservationFrameworkProcessor:
 
     def _process_pre_test_qr_code(self, new_pre_test_qr_code: PreTestDecodedQr) -> None:
         """Process newly detected pre-test QR code"""
+        session_token = self.pre_test_qr_code.session_token
+        new_session_token = new_pre_test_qr_code.session_token
         # get session token and validation recording should contain only one test session
-        if (
-            self.pre_test_qr_code.session_token != ""
-            and self.pre_test_qr_code.session_token
-            != new_pre_test_qr_code.session_token
-        ):
+        if session_token != "" and session_token != new_session_token:
             raise ConfigError(
                 f"session_token does not match, recording should contain only one test session! "
-                f"previous session={self.pre_test_qr_code.session_token}, "
-                f"current session={new_pre_test_qr_code.session_token}"
+                f"previous session={session_token}, "
+                f"current session={new_session_token}"
             )
 
-        if (
-            self.pre_test_qr_code.session_token == ""
-            and new_pre_test_qr_code.session_token != ""
-        ):
+        if session_token == "" and new_session_token != "":
             self.session_log_path = (
-                self.global_configurations.get_log_file_path()
-                + "/"
-                + new_pre_test_qr_code.session_token
+                f"{self.global_configurations.get_log_file_path()}/{new_session_token}"
             )
-            if not os.path.exists(self.session_log_path):
-                os.makedirs(self.session_log_path)
+            os.makedirs(self.session_log_path, exist_ok=True)
 
-            session_log_file = self.session_log_path + "/session.log"
+            session_log_file = f"{self.session_log_path}/session.log"
             logger.info("Entering log file: %s", session_log_file)
             self.log_manager.redirect_logfile(session_log_file)
 
             if logger.getEffectiveLevel() == logging.DEBUG:
-                self.qr_list_file = self.session_log_path + "/qr_code_list.csv"
+                self.qr_list_file = f"{self.session_log_path}/qr_code_list.csv"
                 write_header_to_csv_file(
                     self.qr_list_file,
                     [
@@ -611,6 +670,11 @@ class ObservationFrameworkProcessor:
                         "Test ID",
                     ],
                 )
+                # written on every frame, kept open until close()
+                self.qr_list_file_handle = open(
+                    self.qr_list_file, "a", encoding="utf-8"
+                )
+                self.qr_list_writer = csv.writer(self.qr_list_file_handle)
 
         # When a new pre test QR code is detected then load next test
         if self.pre_test_qr_code.test_id != new_pre_test_qr_code.test_id:
@@ -659,23 +723,32 @@ class ObservationFrameworkProcessor:
         """
         mezzanine_qr_is_detected = False
         for detected_code in detected_qr_codes:
-            if isinstance(detected_code, MezzanineDecodedQr):
+            code_type = type(detected_code)
+            if code_type is MezzanineDecodedQr:
                 self.consecutive_no_qr_count = 0
                 mezzanine_qr_is_detected = True
                 # update threshold based on detected qr code frame rate
-                self.consecutive_no_qr_threshold = round(
-                    self.global_configurations.get_consecutive_no_qr_threshold()
-                    * self.camera_frame_rate
-                    / detected_code.frame_rate
+                threshold = self.consecutive_no_qr_thresholds.get(
+                    detected_code.frame_rate
                 )
+                if threshold is None:
+                    threshold = round(
+                        self.global_configurations.get_consecutive_no_qr_threshold()
+                        * self.camera_frame_rate
+                        / detected_code.frame_rate
+                    )
+                    self.consecutive_no_qr_thresholds[detected_code.frame_rate] = (
+                        threshold
+                    )
+                self.consecutive_no_qr_threshold = threshold
                 # first qr is detected when a new test is started
                 if self.test_started:
                     self.first_qr_is_detected = True
-            if isinstance(detected_code, TestStatusDecodedQr):
+            elif code_type is TestStatusDecodedQr:
                 if detected_code.status == "finished":
                     self.test_started = False
                     self.first_qr_is_detected = False
-            if isinstance(detected_code, PreTestDecodedQr):
+            elif code_type is PreTestDecodedQr:
                 self.test_started = True
 
         if self.first_qr_is_detected and not mezzanine_qr_is_detected:
@@ -693,13 +766,107 @@ class ObservationFrameworkProcessor:
                 f"and the remaining tests are not observed."
             )
 
+    def is_waiting_for_session(self) -> bool:
+        """True until the session is identified by the first pre-test QR code"""
+        return not self.pre_test_qr_code.session_token
+
+    def is_end_of_session(self, camera_frame_number: int) -> bool:
+        """check timeouts to detect the end of session
+
+        Returns:
+            True: when the end of session is reached
+        """
+        # timeouts are compared in frames on every frame
+        # check_timeout() is only called to log the end of session
+        # check timeout after the last test finished event
+        if (
+            0
+            < self.last_end_of_test_camera_frame_num
+            <= camera_frame_number - self.end_of_session_timeout_frame_num
+        ):
+            return self.check_timeout(
+                self.last_end_of_test_camera_frame_num,
+                camera_frame_number,
+                self.end_of_session_timeout,
+            )
+
+        # check timeout when no qr code is detected
+        if (
+            0
+            < self.no_qr_code_frame_num
+            <= camera_frame_number - self.no_qr_code_timeout_frame_num
+        ):
+            return self.check_timeout(
+                self.no_qr_code_frame_num, camera_frame_number, self.no_qr_code_timeout
+            )
+        return False
+
+    def process_detected_qr_codes(
+        self, camera_frame_number: int, detected_qr_codes: List[DecodedQr]
+    ) -> None:
+        """Process QR codes detected on a camera frame"""
+        if not detected_qr_codes:
+            self.no_qr_code_frame_num = camera_frame_number
+            # nothing to write or process, only count frames without QR code
+            self.check_consecutive_no_qr_code(camera_frame_number, detected_qr_codes)
+            return
+
+        self.no_qr_code_frame_num = 0
+        # extract qr code data to a csv file
+        extract_qr_data_to_csv(
+            self.qr_list_writer, camera_frame_number, detected_qr_codes
+        )
+        # check consecutive no qr code detection and
+        # terminates the system when exceed the threshold
+        self.check_consecutive_no_qr_code(camera_frame_number, detected_qr_codes)
+
+        (
+            new_mezzanine_qr_codes,
+            new_test_status_qr_code,
+            new_pre_test_qr_code,
+        ) = self._discard_duplicated_qr_code(detected_qr_codes)
+
+        if new_pre_test_qr_code:
+            self._process_pre_test_qr_code(new_pre_test_qr_code)
+
+        if new_mezzanine_qr_codes:
+            if not self.test_class:
+                logger.warning(
+                    "Mezzanine QR code is detected before identifying the test. "
+                    "observations won't be made, stop process if you want."
+                )
+            self._process_mezzanine_qr_codes(new_mezzanine_qr_codes)
+
+        if new_test_status_qr_code:
+            if not self.test_class:
+                logger.warning(
+                    "Test status QR code is detected before identifying the test. "
+                    "observations won't be made, stop process if you want."
+                )
+            self._process_test_status_qr_code(new_test_status_qr_code)
+
+    def close(self) -> None:
+        """Close files kept open for the session"""
+        if self.qr_list_file_handle is not None:
+            self.qr_list_file_handle.close()
+            self.qr_list_file_handle = None
+            self.qr_list_writer = None
+
     def iter_qr_codes_in_video(
         self, vid_cap, starting_camera_frame_number: int, qr_code_areas: list
     ) -> int:
         """Iterate video frame by frame and detect QR codes.
 
+        Frames are scanned on qr_scan_thread_num threads while the results
+        are processed on this thread in frame order.
+        Until the session is identified each scan is processed before the next
+        frame is read, as the frames to skip depend on the results.
+        When QR codes are detected on a sparsely scanned frame, the frames
+        skipped before it are scanned and processed first.
+
         Args:
-            vid_cap: VideoCapture instance for the current file.
+            vid_cap: VideoCapture instance for the current file, frames must stay
+                valid until max_pending_scan_num further frames are grabbed.
             starting_camera_frame_number: Camera frame number to begin numbering at.
             qr_code_area: List of QR code cropping areas.
 
@@ -708,89 +875,472 @@ class ObservationFrameworkProcessor:
         """
         capture_frame_num = 0
         corrupted_frame_num = 0
+        consecutive_corrupted_frame_num = 0
         len_frames = int(vid_cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        scan_scale = get_scan_scale(
+            int(vid_cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            self.global_configurations.get_max_scan_image_height(),
+        )
+        scan_areas = get_scan_areas(qr_code_areas, scan_scale)
+        # camera frame number where the progress is shown next
+        next_progress_frame_num = (
+            -(-starting_camera_frame_number // PROGRESS_LOG_INTERVAL)
+            * PROGRESS_LOG_INTERVAL
+        )
+        # grayscale image buffers reused across frames, one for each scan at a time
+        image_buffers = []
+        # camera frame number to scan next before the session is identified
+        next_pre_session_scan_frame_num = starting_camera_frame_number
+        # (capture_frame_num, camera_frame_number, image) of the frames skipped
+        # since the last sparsely scanned frame
+        skipped_frames = []
+        # grayscale images of skipped frames reused across frames
+        skipped_frame_buffers = []
+        # (capture_frame_num, camera_frame_number, image, analysis, scan_future,
+        # skipped_frames) in frame order
+        pending_scans = deque()
+        ignore_corrupted_video = (
+            "video" in self.global_configurations.get_ignore_corrupted()
+        )
+        max_corrupted_frame_num = get_max_corrupted_frame_num(
+            vid_cap.get(cv2.CAP_PROP_FPS), self.global_configurations
+        )
+        is_reading = True
+        # bound once instead of being looked up on every frame
+        is_waiting_for_session = self.is_waiting_for_session
+        is_end_of_session = self.is_end_of_session
+        process_detected_qr_codes = self.process_detected_qr_codes
+        max_pending_scan_num = self.max_pending_scan_num
+        pre_session_scan_interval = self.pre_session_scan_interval
+        do_adaptive_threshold_scan = self.do_adaptive_threshold_scan
+        decoder = self.decoder
+
+        with ThreadPoolExecutor(max_workers=self.qr_scan_thread_num) as scan_executor:
+            while is_reading or pending_scans:
+                if (len_frames + corrupted_frame_num) <= capture_frame_num:
+                    is_reading = False
+
+                # process scanned frames in frame order
+                while pending_scans and (
+                    not is_reading
+                    or is_waiting_for_session()
+                    or len(pending_scans) >= max_pending_scan_num
+                ):
+                    (
+                        scan_capture_frame_num,
+                        camera_frame_number,
+                        scan_image,
+                        analysis,
+                        scan_future,
+                        scan_skipped_frames,
+                    ) = pending_scans.popleft()
+
+                    if scan_skipped_frames:
+                        # QR codes detected on a sparsely scanned frame may be
+                        # shown from a skipped frame, those are scanned densely
+                        scan_future.result()
+                        if analysis.all_codes():
+                            end_frame_num = self._process_skipped_frames(
+                                scan_executor,
+                                scan_skipped_frames,
+                                scan_scale,
+                                scan_areas,
+                            )
+                            if end_frame_num is not None:
+                                return end_frame_num
+                        skipped_frame_buffers.extend(
+                            image for _, _, image in scan_skipped_frames
+                        )
 
-        while (len_frames + corrupted_frame_num) > capture_frame_num:
-            got_frame, image = vid_cap.read()
-            if not got_frame:
-                if "video" in self.global_configurations.get_ignore_corrupted():
-                    # work around for gopro
-                    corrupted_frame_num += 1
+                    if is_end_of_session(camera_frame_number):
+                        for pending_scan in pending_scans:
+                            pending_scan[4].cancel()
+                        return scan_capture_frame_num
+
+                    image_buffers.append(scan_future.result())
+                    max_qr_code_num_in_frame = self.max_qr_code_num_in_frame
+                    if analysis.max_qr_code_num_in_frame < max_qr_code_num_in_frame:
+                        # scanned for fewer QR codes before a new test was loaded
+                        analysis = FrameAnalysis(
+                            camera_frame_number,
+                            decoder,
+                            max_qr_code_num_in_frame,
+                            scan_scale,
+                        )
+                        image_buffers.append(
+                            analysis.full_scan(
+                                scan_image,
+                                scan_areas,
+                                do_adaptive_threshold_scan,
+                                image_buffers.pop(),
+                            )
+                        )
+                    # QR codes are the same as when the frame is scanned
+                    # for the QR codes of the current test
+                    analysis.limit_code_num(max_qr_code_num_in_frame)
+                    detected_qr_codes = analysis.all_codes()
+
+                    # show where the processing is currently
+                    if camera_frame_number >= next_progress_frame_num:
+                        logger.info(
+                            "Processed to frame %d...",
+                            camera_frame_number,
+                            extra=PROGRESS,
+                        )
+                        next_progress_frame_num = (
+                            camera_frame_number
+                            - camera_frame_number % PROGRESS_LOG_INTERVAL
+                            + PROGRESS_LOG_INTERVAL
+                        )
+
+                    process_detected_qr_codes(camera_frame_number, detected_qr_codes)
+
+                if not is_reading:
+                    continue
+
+                camera_frame_number = starting_camera_frame_number + capture_frame_num
+                # frames before the first pre-test QR code of the session are redundant
+                # only scan sparsely until the session is identified
+                # frames are scanned densely from then on, including between tests,
+                # so that short pre-test and end of test QR codes are not missed
+                # skipped frames are kept to be scanned when QR codes are
+                # detected on the next sparsely scanned frame
+                is_skipped_frame = (
+                    is_waiting_for_session()
+                    and camera_frame_number < next_pre_session_scan_frame_num
+                )
+                got_frame = vid_cap.grab()
+                # state is up to date when no scan is pending
+                # so the end of session is checked before the frame is retrieved
+                if got_frame and not pending_scans:
+                    if is_end_of_session(camera_frame_number):
+                        return capture_frame_num
+                if got_frame:
+                    got_frame, image = vid_cap.retrieve()
+                if not got_frame:
+                    if ignore_corrupted_video and (
+                        max_corrupted_frame_num == 0
+                        or consecutive_corrupted_frame_num < max_corrupted_frame_num
+                    ):
+                        # work around for gopro
+                        corrupted_frame_num += 1
+                        consecutive_corrupted_frame_num += 1
+                        capture_frame_num += 1
+                    else:
+                        logger.warning(
+                            "Recording frame %d is corrupted. Total recording frame number is %d. "
+                            "If this is not close to the end of recording, observation process "
+                            "will be terminating early.",
+                            capture_frame_num,
+                            len_frames,
+                        )
+                        # process frames scanned so far and stop
+                        is_reading = False
+                    continue
+                consecutive_corrupted_frame_num = 0
+
+                if is_skipped_frame:
+                    skipped_frames.append(
+                        (
+                            capture_frame_num,
+                            camera_frame_number,
+                            copy_gray_image(
+                                image,
+                                (
+                                    skipped_frame_buffers.pop()
+                                    if skipped_frame_buffers
+                                    else None
+                                ),
+                            ),
+                        )
+                    )
                     capture_frame_num += 1
                     continue
-                else:
-                    logger.warning(
-                        "Recording frame %d is corrupted. Total recording frame number is %d. "
-                        "If this is not close to the end of recording, observation process will be "
-                        "terminating early.",
+                if is_waiting_for_session():
+                    next_pre_session_scan_frame_num = (
+                        camera_frame_number + pre_session_scan_interval
+                    )
+
+                analysis = FrameAnalysis(
+                    camera_frame_number,
+                    decoder,
+                    self.max_qr_code_num_in_frame,
+                    scan_scale,
+                )
+                scan_future = scan_executor.submit(
+                    analysis.full_scan,
+                    image,
+                    scan_areas,
+                    do_adaptive_threshold_scan,
+                    image_buffers.pop() if image_buffers else None,
+                )
+                pending_scans.append(
+                    (
                         capture_frame_num,
-                        len_frames,
+                        camera_frame_number,
+                        image,
+                        analysis,
+                        scan_future,
+                        skipped_frames,
                     )
-                    break
+                )
+                skipped_frames = []
 
-            camera_frame_number = starting_camera_frame_number + capture_frame_num
+                capture_frame_num += 1
 
-            # check timeout after the last test finished event
-            if self.check_timeout(
-                self.last_end_of_test_camera_frame_num,
-                camera_frame_number,
-                self.end_of_session_timeout,
-            ):
-                break
+        return capture_frame_num
 
-            # check timeout when no qr code is detected
-            if self.check_timeout(
-                self.no_qr_code_frame_num, camera_frame_number, self.no_qr_code_timeout
-            ):
-                break
+    def _process_skipped_frames(
+        self,
+        scan_executor: ThreadPoolExecutor,
+        skipped_frames: list,
+        scan_scale: float,
+        scan_areas: List[list],
+    ) -> Optional[int]:
+        """Scan frames skipped before a sparsely scanned frame
+        and process them in frame order.
 
+        Args:
+            scan_executor: executor to scan the frames on
+            skipped_frames: (capture_frame_num, camera_frame_number, image)
+                of each skipped frame, images are overwritten by the scan
+            scan_scale: scale to downscale the frames to before scanning
+            scan_areas: QR code cropping areas in the scanned image
+
+        Returns:
+            capture frame number where the end of session is reached, otherwise None
+        """
+        scans = []
+        for capture_frame_num, camera_frame_number, image in skipped_frames:
             analysis = FrameAnalysis(
-                camera_frame_number, self.decoder, self.max_qr_code_num_in_frame
+                camera_frame_number,
+                self.decoder,
+                self.max_qr_code_num_in_frame,
+                scan_scale,
             )
-            analysis.full_scan(image, qr_code_areas, self.do_adaptive_threshold_scan)
-            detected_qr_codes = analysis.all_codes()
-            if detected_qr_codes:
-                self.no_qr_code_frame_num = 0
-            else:
-                self.no_qr_code_frame_num = camera_frame_number
+            # grayscale copy is inverted in place
+            scan_future = scan_executor.submit(
+                analysis.full_scan,
+                image,
+                scan_areas,
+                self.do_adaptive_threshold_scan,
+                image,
+            )
+            scans.append(
+                (capture_frame_num, camera_frame_number, analysis, scan_future)
+            )
+
+        for capture_frame_num, camera_frame_number, analysis, scan_future in scans:
+            if self.is_end_of_session(camera_frame_number):
+                for scan in scans:
+                    scan[3].cancel()
+                return capture_frame_num
+            scan_future.result()
+            # no test is loaded yet, so the frames are scanned for
+            # at least the number of QR codes of the current test
+            analysis.limit_code_num(self.max_qr_code_num_in_frame)
+            self.process_detected_qr_codes(camera_frame_number, analysis.all_codes())
+        return None
+
+    def iter_scanned_qr_codes(
+        self, scanned_qr_codes: list, starting_camera_frame_number: int
+    ) -> int:
+        """Iterate QR codes scanned in advance by scan_qr_codes_in_video
+        frame by frame and process them.
+        Frames are processed in the same way as by iter_qr_codes_in_video,
+        including the sparse scan until the session is identified,
+        so that the same QR codes are processed.
 
-            # print out where the processing is currently
-            if camera_frame_number % 10 == 0:
-                print(f"Processed to frame {camera_frame_number}...")
+        Args:
+            scanned_qr_codes: list of scan_qr_codes_in_video results of each
+                recording frame, None for corrupted recording frames.
+            starting_camera_frame_number: Camera frame number to begin numbering at.
 
-            # extract qr code data to a csv file
-            extract_qr_data_to_csv(
-                self.qr_list_file, camera_frame_number, detected_qr_codes
-            )
-            # check consecutive no qr code detection and
-            # terminates the system when exceed the threshold
-            self.check_consecutive_no_qr_code(camera_frame_number, detected_qr_codes)
+        Returns:
+            Last camera frame number in this file +1 (i.e. can be used as input to the next call).
+        """
+        analysis = FrameAnalysis(
+            starting_camera_frame_number, self.decoder, self.max_qr_code_num_in_frame
+        )
+        # camera frame number to scan next before the session is identified
+        next_pre_session_scan_frame_num = starting_camera_frame_number
+        # capture frame numbers of the frames skipped
+        # since the last sparsely scanned frame
+        skipped_frame_nums = []
+        for capture_frame_num, frame_scan in enumerate(scanned_qr_codes):
+            if frame_scan is None:
+                # ignored corrupted frame
+                continue
+
+            camera_frame_number = starting_camera_frame_number + capture_frame_num
+            if self.is_end_of_session(camera_frame_number):
+                return capture_frame_num
 
-            (
-                new_mezzanine_qr_codes,
-                new_test_status_qr_code,
-                new_pre_test_qr_code,
-            ) = self._discard_duplicated_qr_code(detected_qr_codes)
+            if self.is_waiting_for_session():
+                if camera_frame_number < next_pre_session_scan_frame_num:
+                    skipped_frame_nums.append(capture_frame_num)
+                    continue
+                next_pre_session_scan_frame_num = (
+                    camera_frame_number + self.pre_session_scan_interval
+                )
+                if frame_scan and skipped_frame_nums:
+                    # QR codes detected on a sparsely scanned frame,
+                    # the frames skipped before it are processed first
+                    for skipped_frame_num in skipped_frame_nums:
+                        skipped_camera_frame_number = (
+                            starting_camera_frame_number + skipped_frame_num
+                        )
+                        if self.is_end_of_session(skipped_camera_frame_number):
+                            return skipped_frame_num
+                        self._process_scanned_frame(
+                            analysis,
+                            skipped_camera_frame_number,
+                            scanned_qr_codes[skipped_frame_num],
+                        )
+                    if self.is_end_of_session(camera_frame_number):
+                        return capture_frame_num
+                skipped_frame_nums = []
 
-            if new_pre_test_qr_code:
-                self._process_pre_test_qr_code(new_pre_test_qr_code)
+            self._process_scanned_frame(analysis, camera_frame_number, frame_scan)
 
-            if new_mezzanine_qr_codes:
-                if not self.test_class:
-                    logger.warning(
-                        "Mezzanine QR code is detected before identifying the test. "
-                        "observations won't be made, stop process if you want."
-                    )
-                self._process_mezzanine_qr_codes(new_mezzanine_qr_codes)
+        return len(scanned_qr_codes)
 
-            if new_test_status_qr_code:
-                if not self.test_class:
+    def _process_scanned_frame(
+        self, analysis: FrameAnalysis, camera_frame_number: int, frame_scan: tuple
+    ) -> None:
+        """Translate QR codes of a frame scanned by scan_qr_codes_in_video
+        and process them.
+
+        Args:
+            analysis: FrameAnalysis reused to collect the QR codes
+            camera_frame_number: camera frame number of the frame
+            frame_scan: scan_qr_codes_in_video result of the frame
+        """
+        analysis.reset(camera_frame_number)
+        if frame_scan:
+            scanned_codes, pass_code_nums = frame_scan
+            # scanned QR codes are translated here where the camera frame number is known
+            for data, location in scanned_codes:
+                code = self.decoder.translate_qr(data, location, camera_frame_number)
+                if code is not None:
+                    analysis.add_code(code)
+            # frames are scanned for all QR codes as the current test is unknown
+            analysis.pass_code_nums = list(pass_code_nums)
+            analysis.limit_code_num(self.max_qr_code_num_in_frame)
+
+        self.process_detected_qr_codes(camera_frame_number, analysis.all_codes())
+
+
+def scan_qr_codes_in_video(
+    input_video_path_str: str,
+    qr_code_areas: list,
+    do_adaptive_threshold_scan: bool,
+    global_configurations: GlobalConfigurations,
+) -> Tuple[VideoProperties, list]:
+    """Scan QR codes in a recording frame by frame without processing them.
+    This is run in a worker process so that recordings are scanned in parallel.
+    The recording is read from the first frame without seeking,
+    so that the same frames are scanned as by iter_qr_codes_in_video.
+    Frames are scanned for all QR codes as the current test is unknown,
+    the number of QR codes found after each scan pass is returned so that
+    the QR codes found when scanning for fewer QR codes can be selected.
+    QR code data is returned untranslated as the camera frame number
+    is only known when the previous frames are processed.
+
+    Args:
+        input_video_path_str: recording file path
+        qr_code_areas: List of QR code cropping areas.
+        do_adaptive_threshold_scan: additional adaptiveThreshold in qr code scan
+        global_configurations: to get configuration from
+
+    Returns:
+        video_properties: properties of the recording as opened for the scan
+        scanned_qr_codes: list of scanned QR codes of each recording frame,
+            ((data, location) of each QR code, number of QR codes after each
+            scan pass), empty tuple when no QR code is found on the frame,
+            None for ignored corrupted recording frames.
+            The list ends early when the scan stopped on a corrupted frame,
+            and is empty when the recording is not a valid video.
+    """
+    configure_opencv_threads(global_configurations)
+    vid_cap = open_video_capture(input_video_path_str, global_configurations)
+    try:
+        video_properties = VideoProperties(vid_cap)
+        if not video_properties.is_valid():
+            return video_properties, []
+
+        len_frames = video_properties.frame_count
+        scan_scale = get_scan_scale(
+            video_properties.height,
+            global_configurations.get_max_scan_image_height(),
+        )
+        scan_areas = get_scan_areas(qr_code_areas, scan_scale)
+        # decode next frames while the current frame is scanned
+        vid_cap = ThreadedVideoCapture(vid_cap)
+
+        # QR codes are counted as the processing counts them
+        decoder = DPCTFQrDecoder()
+        scanned_qr_codes = []
+        capture_frame_num = 0
+        corrupted_frame_num = 0
+        consecutive_corrupted_frame_num = 0
+        ignore_corrupted_video = "video" in global_configurations.get_ignore_corrupted()
+        max_corrupted_frame_num = get_max_corrupted_frame_num(
+            video_properties.fps, global_configurations
+        )
+        # the current test is unknown while scanning so scan for all QR codes
+        analysis = FrameAnalysis(
+            capture_frame_num, decoder, max_qr_code_num_in_frame=3, scale=scan_scale
+        )
+        # grayscale image buffer reused across frames
+        image_buffer = None
+
+        while (len_frames + corrupted_frame_num) > capture_frame_num:
+            got_frame, image = vid_cap.read()
+            if not got_frame:
+                if ignore_corrupted_video and (
+                    max_corrupted_frame_num == 0
+                    or consecutive_corrupted_frame_num < max_corrupted_frame_num
+                ):
+                    # work around for gopro
+                    scanned_qr_codes.append(None)
+                    corrupted_frame_num += 1
+                    consecutive_corrupted_frame_num += 1
+                    capture_frame_num += 1
+                    continue
+                else:
                     logger.warning(
-                        "Test status QR code is detected before identifying the test. "
-                        "observations won't be made, stop process if you want."
+                        "Recording frame %d of '%s' is corrupted.",
+                        capture_frame_num,
+                        input_video_path_str,
                     )
-                self._process_test_status_qr_code(new_test_status_qr_code)
-
+                    break
+            consecutive_corrupted_frame_num = 0
+
+            analysis.reset(capture_frame_num)
+            image_buffer = analysis.full_scan(
+                image,
+                scan_areas,
+                do_adaptive_threshold_scan,
+                image_buffer,
+            )
+            qr_codes = analysis.all_codes()
+            if qr_codes:
+                scanned_qr_codes.append(
+                    (
+                        [(code.data, code.location) for code in qr_codes],
+                        analysis.pass_code_nums,
+                    )
+                )
+            else:
+                scanned_qr_codes.append(())
             capture_frame_num += 1
-
-        return capture_frame_num
+    finally:
+        vid_cap.release()
+
+    logger.debug(
+        "Scanned QR codes in %d frames of recording '%s'.",
+        capture_frame_num,
+        input_video_path_str,
+    )
+    return video_properties, scanned_qr_codes
@@ -197,13 +197,12 @@ class ObservationResultHandler:
 
     def _create_results_dir(self, filename: str) -> None:
         """Create a results directory if not already there"""
-        if not os.path.exists(os.path.dirname(filename)):
-            try:
-                os.makedirs(os.path.dirname(filename))
-            except OSError as e:
-                raise ObsFrameError(
-                    f"Error: Unable to create a results directory {filename}"
-                ) from e
+        try:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+        except OSError as e:
+            raise ObsFrameError(
+                f"Error: Unable to create a results directory {filename}"
+            ) from e
 
     def post_result(
         self, session_token: str, test_path: str, observation_results: List[dict]
@@ -26,8 +26,7 @@ Contributor: Resillion UK Limited
 """
 import csv
 import logging
-import os
-from typing import List, Tuple
+from typing import Any, List, Tuple
 
 import matplotlib.pyplot as plt
 
@@ -41,11 +40,8 @@ logging.getLogger("matplotlib.font_manager").disabled = True
 
 def write_header_to_csv_file(file_name: str, header: List[str]):
     """write header to a csv file"""
-    # remove existing csv file, only keep the last result
-    if os.path.exists(file_name):
-        os.remove(file_name)
-
-    with open(file_name, "a", encoding="utf-8") as file:
+    # overwrite existing csv file, only keep the last result
+    with open(file_name, "w", encoding="utf-8") as file:
         file_writer = csv.writer(file)
         file_writer.writerow(header)
         file.close()
@@ -53,11 +49,8 @@ def write_header_to_csv_file(file_name: str, header: List[str]):
 
 def write_data_to_csv_file(file_name: str, header: List[str], data: List[Tuple]):
     """export time differences to csv file"""
-    # remove existing csv file, only keep the last result
-    if os.path.exists(file_name):
-        os.remove(file_name)
-
-    with open(file_name, "a", encoding="utf-8") as csv_file:
+    # overwrite existing csv file, only keep the last result
+    with open(file_name, "w", encoding="utf-8") as csv_file:
         writer = csv.writer(csv_file)
         writer.writerow(header)
 
@@ -65,80 +58,94 @@ def write_data_to_csv_file(file_name: str, header: List[str], data: List[Tuple])
             writer.writerow(row_data)
 
 
+def _mezzanine_csv_row(
+    camera_frame_number: int, detected_code: MezzanineDecodedQr
+) -> list:
+    """qr code list csv row of a mezzanine QR code"""
+    return [
+        camera_frame_number,
+        detected_code.content_id,
+        detected_code.media_time,
+        detected_code.frame_number,
+        detected_code.frame_rate,
+        detected_code.location,
+        "",
+        "",
+        "",
+        "",
+        "",
+        "",
+    ]
+
+
+def _test_status_csv_row(
+    camera_frame_number: int, detected_code: TestStatusDecodedQr
+) -> list:
+    """qr code list csv row of a test status QR code"""
+    return [
+        camera_frame_number,
+        "",
+        "",
+        "",
+        "",
+        "",
+        detected_code.status,
+        detected_code.last_action,
+        detected_code.current_time,
+        detected_code.delay,
+        "",
+        "",
+    ]
+
+
+def _pre_test_csv_row(
+    camera_frame_number: int, detected_code: PreTestDecodedQr
+) -> list:
+    """qr code list csv row of a pre-test QR code"""
+    return [
+        camera_frame_number,
+        "",
+        "",
+        "",
+        "",
+        "",
+        "",
+        "",
+        "",
+        "",
+        detected_code.session_token,
+        detected_code.test_id,
+    ]
+
+
+_QR_CSV_ROW_BUILDERS = {
+    MezzanineDecodedQr: _mezzanine_csv_row,
+    TestStatusDecodedQr: _test_status_csv_row,
+    PreTestDecodedQr: _pre_test_csv_row,
+}
+"""qr code list csv row builder of each QR code type"""
+
+
 def extract_qr_data_to_csv(
-    file_name: str, camera_frame_number: int, detected_qr_codes: List[DecodedQr]
+    file_writer: Any, camera_frame_number: int, detected_qr_codes: List[DecodedQr]
 ) -> None:
-    """Extract camera frame number and detected qr code data to a csv file"""
-    if not file_name:
+    """Extract camera frame number and detected qr code data to a csv file
+    file_writer is a csv writer of the file kept open for the session
+    """
+    if file_writer is None or not detected_qr_codes:
         return
 
-    with open(file_name, "a", encoding="utf-8") as file:
-        file_writer = csv.writer(file)
-
-        for detected_code in detected_qr_codes:
-            if isinstance(detected_code, MezzanineDecodedQr):
-                file_writer.writerow(
-                    [
-                        camera_frame_number,
-                        detected_code.content_id,
-                        detected_code.media_time,
-                        detected_code.frame_number,
-                        detected_code.frame_rate,
-                        detected_code.location,
-                        "",
-                        "",
-                        "",
-                        "",
-                        "",
-                        "",
-                    ]
-                )
-            elif isinstance(detected_code, TestStatusDecodedQr):
-                file_writer.writerow(
-                    [
-                        camera_frame_number,
-                        "",
-                        "",
-                        "",
-                        "",
-                        "",
-                        detected_code.status,
-                        detected_code.last_action,
-                        detected_code.current_time,
-                        detected_code.delay,
-                        "",
-                        "",
-                    ]
-                )
-            elif isinstance(detected_code, PreTestDecodedQr):
-                file_writer.writerow(
-                    [
-                        camera_frame_number,
-                        "",
-                        "",
-                        "",
-                        "",
-                        "",
-                        "",
-                        "",
-                        "",
-                        "",
-                        detected_code.session_token,
-                        detected_code.test_id,
-                    ]
-                )
-            else:
-                continue
-
-        file.close()
+    # rows of the frame are written at once
+    rows = []
+    for detected_code in detected_qr_codes:
+        build_row = _QR_CSV_ROW_BUILDERS.get(type(detected_code))
+        if build_row is not None:
+            rows.append(build_row(camera_frame_number, detected_code))
+    file_writer.writerows(rows)
 
 
 def audio_data_to_csv(file_name: str, data: List[AudioSegment], parameters_dict: dict):
     """export audio segment data to csv file"""
-    # remove existing csv file, only keep the last result
-    if os.path.exists(file_name):
-        os.remove(file_name)
-
     header = [
         "Content ID",
         "Duration",
@@ -146,7 +153,8 @@ def audio_data_to_csv(file_name: str, data: List[AudioSegment], parameters_dict:
         "Time in Recording",
         "Detected Time",
     ]
-    with open(file_name, "a", encoding="utf-8") as csv_file:
+    # overwrite existing csv file, only keep the last result
+    with open(file_name, "w", encoding="utf-8") as csv_file:
         writer = csv.writer(csv_file)
         writer.writerow(header)
 
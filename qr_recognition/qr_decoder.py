@@ -34,6 +34,9 @@ logger = logging.getLogger(__name__)
 class DecodedQr:
     """Base class for decoded QR codes."""
 
+    # no instance __dict__, one object is kept for every detected QR code
+    __slots__ = ("data", "location")
+
     data: str
     """ qr code string"""
 
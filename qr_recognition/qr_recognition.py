@@ -25,11 +25,30 @@ Licensor: Consumer Technology Association
 Contributor: Resillion UK Limited
 """
 import logging
+import threading
+from ctypes import c_void_p
 from typing import Any, List
 
 import cv2
 import numpy as np
 from pyzbar.pyzbar import ZBarSymbol, decode
+from pyzbar.pyzbar_error import PyZbarError
+
+try:
+    # internals of pyzbar 0.1.9 (pinned in install.sh), used by QrScanner
+    # to reuse the zbar scanner, the public decode() is used without them
+    from pyzbar.pyzbar import _FOURCC, _decode_symbols, _image, _symbols_for_image
+    from pyzbar.wrapper import (
+        ZBarConfig,
+        zbar_image_scanner_create,
+        zbar_image_scanner_set_config,
+        zbar_image_set_data,
+        zbar_image_set_format,
+        zbar_image_set_size,
+        zbar_scan_image,
+    )
+except ImportError:
+    _image = None
 
 from .qr_decoder import DecodedQr, QrDecoder
 
@@ -40,16 +59,143 @@ OpenCvImageHint = Any
 """Type hint for an OpenCV image"""
 
 
+def prepare_qr_image(
+    webcam_image: OpenCvImageHint, image_buffer: OpenCvImageHint = None
+) -> OpenCvImageHint:
+    """Convert a webcam capture video frame to the inverted grayscale image
+    that is scanned for QR codes.
+    image_buffer is written to instead of allocating a new image when it fits."""
+    if image_buffer is not None and image_buffer.shape != webcam_image.shape[:2]:
+        image_buffer = None
+
+    if webcam_image.ndim == 2:
+        # frame is already grayscale e.g. converted when decoded on GPU
+        return np.bitwise_not(webcam_image, out=image_buffer)
+
+    image = cv2.cvtColor(webcam_image, cv2.COLOR_BGR2GRAY, dst=image_buffer)
+    np.bitwise_not(image, out=image)
+    return image
+
+
+def copy_gray_image(
+    webcam_image: OpenCvImageHint, image_buffer: OpenCvImageHint = None
+) -> OpenCvImageHint:
+    """Copy a webcam capture video frame as grayscale image, so that it can
+    be scanned later when the frame buffer is reused by the video capture.
+    image_buffer is written to instead of allocating a new image when it fits."""
+    if image_buffer is not None and image_buffer.shape != webcam_image.shape[:2]:
+        image_buffer = None
+
+    if webcam_image.ndim == 2:
+        if image_buffer is None:
+            return webcam_image.copy()
+        np.copyto(image_buffer, webcam_image)
+        return image_buffer
+
+    return cv2.cvtColor(webcam_image, cv2.COLOR_BGR2GRAY, dst=image_buffer)
+
+
+class QrScanner:
+    """ZBar image scanner configured once to scan QR codes only.
+
+    pyzbar.decode() creates and configures a new scanner, and copies the image,
+    on every call. The scanner is created once per thread and reused instead,
+    and the image data is passed to zbar without copying it.
+    This relies on pyzbar internals, pyzbar.decode() is used when another
+    pyzbar version does not provide them.
+    """
+
+    scanner: Any
+    """zbar image scanner, None when pyzbar.decode() is used"""
+
+    def __init__(self):
+        self.scanner = None
+        if _image is None:
+            logger.debug("pyzbar internals are not available, pyzbar.decode is used.")
+            return
+        self.scanner = zbar_image_scanner_create()
+        if not self.scanner:
+            raise PyZbarError("Could not create image scanner")
+        for symbol in ZBarSymbol:
+            enable = 1 if symbol == ZBarSymbol.QRCODE else 0
+            zbar_image_scanner_set_config(
+                self.scanner, symbol, ZBarConfig.CFG_ENABLE, enable
+            )
+
+    def decode(self, image: OpenCvImageHint) -> list:
+        """Decode QR codes in a grayscale image, returns pyzbar Decoded list"""
+        if self.scanner is None:
+            return decode(image, symbols=[ZBarSymbol.QRCODE])
+        # cropped images are views of the frame, zbar needs contiguous data
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+        height, width = image.shape[:2]
+        with _image() as zbar_image:
+            zbar_image_set_format(zbar_image, _FOURCC["L800"])
+            zbar_image_set_size(zbar_image, width, height)
+            zbar_image_set_data(
+                zbar_image, image.ctypes.data_as(c_void_p), image.nbytes, None
+            )
+            if zbar_scan_image(self.scanner, zbar_image) < 0:
+                raise PyZbarError("Unsupported image format")
+            return list(_decode_symbols(_symbols_for_image(zbar_image)))
+
+
+_thread_local = threading.local()
+"""holds QrScanner of each thread, zbar scanners can not be shared between threads"""
+
+
+def get_qr_scanner() -> QrScanner:
+    """Get QrScanner of this thread, created on first use"""
+    qr_scanner = getattr(_thread_local, "qr_scanner", None)
+    if qr_scanner is None:
+        qr_scanner = QrScanner()
+        _thread_local.qr_scanner = qr_scanner
+    return qr_scanner
+
+
+def get_scan_scale(image_height: int, max_scan_image_height: int) -> float:
+    """Get the scale to downscale frames to max_scan_image_height before
+    scanning, 1.0 when frames are scanned in the recorded resolution."""
+    if max_scan_image_height <= 0 or image_height <= max_scan_image_height:
+        return 1.0
+    return max_scan_image_height / image_height
+
+
+def scale_qr_code_areas(qr_code_areas: list, scale: float) -> list:
+    """Scale QR code cropping area or list of areas to the scanned image"""
+    if qr_code_areas and isinstance(qr_code_areas[0], list):
+        return [
+            scale_qr_code_areas(qr_code_area, scale) for qr_code_area in qr_code_areas
+        ]
+    return [int(value * scale) for value in qr_code_areas]
+
+
+def get_scan_areas(qr_code_areas: list, scale: float = 1.0) -> List[list]:
+    """Get the list of QR code cropping areas in the scanned image
+    from a cropping area or list of cropping areas of the recording.
+    Prepared once for a recording, so that frames are cropped directly.
+    """
+    if qr_code_areas and not isinstance(qr_code_areas[0], list):
+        qr_code_areas = [qr_code_areas]
+    scan_areas = [qr_code_area for qr_code_area in qr_code_areas if qr_code_area]
+    if scale != 1.0:
+        scan_areas = scale_qr_code_areas(scan_areas, scale)
+    return scan_areas
+
+
 def decode_qrs_in_image(
     image: OpenCvImageHint,
     decoder: QrDecoder,
     camera_frame_num: int,
     qr_code_area: list,
     cropped: bool,
+    scale: float = 1.0,
 ) -> List[DecodedQr]:
-    """Given an image, do a basic QR code recognition pass using pyzbar."""
+    """Given an image, do a basic QR code recognition pass using pyzbar.
+    When the image is downscaled, locations are scaled back to the recorded resolution.
+    """
     results = []
-    for qr in decode(image, symbols=[ZBarSymbol.QRCODE]):
+    for qr in get_qr_scanner().decode(image):
         data = qr.data.decode("ISO-8859-1")
         # if the qr code has been cropped we convert the x and y location values
         # to relative position for full screen
@@ -64,10 +210,11 @@ def decode_qrs_in_image(
                 # height of qr code
                 qr.rect.height,
             ]
-            code = decoder.translate_qr(data, location, camera_frame_num)
         else:
             location = [qr.rect.left, qr.rect.top, qr.rect.width, qr.rect.height]
-            code = decoder.translate_qr(data, location, camera_frame_num)
+        if scale != 1.0:
+            location = [round(value / scale) for value in location]
+        code = decoder.translate_qr(data, location, camera_frame_num)
         if code is not None:
             results.append(code)
     return results
@@ -86,14 +233,32 @@ class FrameAnalysis:
     """decoder - suitable decoder will be selected when creating FrameAnalysis."""
     max_qr_code_num_in_frame: int
     """Maximum number of QR code can be detected in a frame"""
+    scale: float
+    """scale to downscale the frame to before scanning, 1.0 to scan as recorded"""
+    pass_code_nums: List[int]
+    """number of QR codes found after each scan pass of full_scan()"""
 
     def __init__(
-        self, capture_frame_num: int, decoder: QrDecoder, max_qr_code_num_in_frame: int
+        self,
+        capture_frame_num: int,
+        decoder: QrDecoder,
+        max_qr_code_num_in_frame: int,
+        scale: float = 1.0,
     ):
         self.capture_frame_num = capture_frame_num
         self.decoder = decoder
         self.qr_codes = []
         self.max_qr_code_num_in_frame = max_qr_code_num_in_frame
+        self.scale = scale
+        self.pass_code_nums = []
+
+    def reset(self, capture_frame_num: int) -> None:
+        """Reuse this FrameAnalysis to scan the next frame.
+        A new QR code list is started as the codes of the previous frame
+        may still be referenced."""
+        self.capture_frame_num = capture_frame_num
+        self.qr_codes = []
+        self.pass_code_nums = []
 
     def add_code(self, code: DecodedQr) -> None:
         """Add a QR code to the list."""
@@ -113,12 +278,29 @@ class FrameAnalysis:
         else:
             return True
 
+    def limit_code_num(self, max_qr_code_num_in_frame: int) -> None:
+        """Keep only the QR codes that full_scan() finds when scanning for
+        max_qr_code_num_in_frame QR codes, as the scan passes after the one
+        where all QR codes are found are then skipped.
+        The frame must have been scanned for at least this number of QR codes.
+        """
+        for code_num in self.pass_code_nums:
+            if code_num >= max_qr_code_num_in_frame:
+                self.qr_codes = self.qr_codes[:code_num]
+                break
+        self.max_qr_code_num_in_frame = max_qr_code_num_in_frame
+
     def _scan_image(
         self, image: OpenCvImageHint, qr_code_area: list = None, cropped: bool = False
     ) -> None:
         """Do a basic initial scan for QR codes in the image."""
         for code in decode_qrs_in_image(
-            image, self.decoder, self.capture_frame_num, qr_code_area, cropped
+            image,
+            self.decoder,
+            self.capture_frame_num,
+            qr_code_area,
+            cropped,
+            self.scale,
         ):
             self.add_code(code)
 
@@ -133,25 +315,43 @@ class FrameAnalysis:
     def full_scan(
         self,
         webcam_image: OpenCvImageHint,
-        qr_code_areas: list,
+        scan_areas: List[list],
         do_adaptive_threshold_scan: bool,
-    ) -> None:
-        """Do a full scan of the specified webcam capture video frame."""
-        image = cv2.cvtColor(webcam_image, cv2.COLOR_BGR2GRAY)
-        np.bitwise_not(image, out=image)
-        self._scan_image(image, qr_code_areas)
+        image_buffer: OpenCvImageHint = None,
+    ) -> OpenCvImageHint:
+        """Do a full scan of the specified webcam capture video frame.
+
+        scan_areas are the cropping areas in the scanned image from get_scan_areas().
+
+        Returns the scanned grayscale image, pass it back as image_buffer
+        when scanning the next frame to reuse its memory.
+        """
+        image = prepare_qr_image(webcam_image, image_buffer)
+        scan_image = image
+        if self.scale != 1.0:
+            scan_image = cv2.resize(
+                image, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA
+            )
+
+        self._scan_image(scan_image)
+        self.pass_code_nums.append(len(self.qr_codes))
 
         if not self.all_code_found():
-            if qr_code_areas:
-                if isinstance(qr_code_areas[0], list):
-                    for qr_code_area in qr_code_areas:
-                        self.scan_cropped_image(image, qr_code_area)
-                else:
-                    self.scan_cropped_image(image, qr_code_areas)
+            for scan_area in scan_areas:
+                self.scan_cropped_image(scan_image, scan_area)
+            self.pass_code_nums.append(len(self.qr_codes))
 
         # do adaptiveThreshold scan when it is defined to do so
         if do_adaptive_threshold_scan and not self.all_code_found():
             threshold_image = cv2.adaptiveThreshold(
-                image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
+                scan_image,
+                255,
+                cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                cv2.THRESH_BINARY,
+                11,
+                2,
             )
             self._scan_image(threshold_image)
+            self.pass_code_nums.append(len(self.qr_codes))
+
+        return image
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""Check that recordings scanned in worker processes give the same results
+as recordings scanned and processed frame by frame.
+
+A short recording with test runner QR codes is generated, as the framework
+scans recordings of a display, QR codes are recorded inverted.
+Skipped when OpenCV, numpy or pyzbar is not installed.
+
+Software: WAVE Observation Framework
+License: Apache 2.0 https://www.apache.org/licenses/LICENSE-2.0.txt
+Licensor: Consumer Technology Association
+Contributor: Resillion UK Limited
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+np = pytest.importorskip("numpy")
+pytest.importorskip("pyzbar")
+
+REPO_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_DIR))
+
+# pylint: disable=wrong-import-position
+import observation_framework_processor  # noqa: E402
+from dpctf_qr_decoder import PreTestDecodedQr  # noqa: E402
+from global_configurations import GlobalConfigurations  # noqa: E402
+from observation_framework_processor import (  # noqa: E402
+    ObservationFrameworkProcessor,
+    scan_qr_codes_in_video,
+)
+from video_capture_handler import (  # noqa: E402
+    LumaVideoCapture,
+    ThreadedVideoCapture,
+    VideoProperties,
+    open_video_capture,
+)
+
+FPS = 30
+WIDTH = 640
+HEIGHT = 480
+FRAME_NUM = 120
+QR_CODE_AREAS = [[0, 0, WIDTH // 2, HEIGHT], [WIDTH // 2, 0, WIDTH, HEIGHT]]
+
+PRE_TEST_1 = '{"session_token":"token","test_id":"1"}'
+PRE_TEST_2 = '{"session_token":"token","test_id":"2"}'
+PLAYING = '{"s":"playing","a":"play"}'
+FINISHED = '{"s":"finished","a":"play"}'
+# (first frame, last frame, left position, QR code data)
+QR_CODES = [
+    # before the session in frames skipped by the sparse scan
+    (8, 11, 20, "intro"),
+    (25, 59, 20, PRE_TEST_1),
+    (40, 79, 460, PLAYING),
+    (60, 99, 240, "content"),
+    (80, 89, 460, FINISHED),
+    (90, 119, 20, PRE_TEST_2),
+]
+
+
+def write_recording(file_path: str) -> None:
+    """Write the test recording"""
+    encoder = cv2.QRCodeEncoder.create()
+    qr_images = {}
+    for _, _, _, data in QR_CODES:
+        qr_image = encoder.encode(data)
+        qr_images[data] = cv2.resize(
+            qr_image, None, fx=4, fy=4, interpolation=cv2.INTER_NEAREST
+        )
+
+    writer = cv2.VideoWriter(
+        file_path, cv2.VideoWriter_fourcc(*"MJPG"), FPS, (WIDTH, HEIGHT)
+    )
+    try:
+        for frame_num in range(FRAME_NUM):
+            frame = np.full((HEIGHT, WIDTH), 255, dtype=np.uint8)
+            for first_frame, last_frame, left, data in QR_CODES:
+                if first_frame <= frame_num <= last_frame:
+                    qr_image = qr_images[data]
+                    top = 160
+                    frame[
+                        top : top + qr_image.shape[0], left : left + qr_image.shape[1]
+                    ] = qr_image
+            writer.write(cv2.cvtColor(np.bitwise_not(frame), cv2.COLOR_GRAY2BGR))
+    finally:
+        writer.release()
+
+
+def create_processor(
+    global_configurations: GlobalConfigurations,
+) -> ObservationFrameworkProcessor:
+    """Create processor recording the processed QR codes of each frame,
+    tests are identified from the pre-test QR codes without loading them.
+    The first test scans for one QR code per frame as audio tests do."""
+    processor = ObservationFrameworkProcessor(
+        0, None, global_configurations, FPS, False
+    )
+    processor.processed_frames = []
+
+    def process_detected_qr_codes(camera_frame_number: int, detected_qr_codes):
+        processor.processed_frames.append(
+            (camera_frame_number, [code.data for code in detected_qr_codes])
+        )
+        for code in detected_qr_codes:
+            if (
+                isinstance(code, PreTestDecodedQr)
+                and code.test_id != processor.pre_test_qr_code.test_id
+            ):
+                processor.pre_test_qr_code = code
+                processor.max_qr_code_num_in_frame = 1 if code.test_id == "1" else 3
+
+    processor.process_detected_qr_codes = process_detected_qr_codes
+    return processor
+
+
+@pytest.fixture(name="global_configurations")
+def fixture_global_configurations(monkeypatch) -> GlobalConfigurations:
+    """Global configurations read from the repository config.ini,
+    test runner configuration is not used by the test."""
+    monkeypatch.chdir(REPO_DIR)
+    monkeypatch.setattr(
+        observation_framework_processor,
+        "ConfigurationParser",
+        lambda global_configurations: None,
+    )
+    return GlobalConfigurations()
+
+
+def scan_sequentially(
+    file_path: str, global_configurations: GlobalConfigurations
+) -> ObservationFrameworkProcessor:
+    """Scan and process the recording frame by frame as run() does without workers,
+    returns the processor with the number of frames read as read_frame_num"""
+    processor = create_processor(global_configurations)
+    vid_cap = ThreadedVideoCapture(
+        open_video_capture(file_path, global_configurations),
+        kept_frame_num=processor.max_pending_scan_num,
+    )
+    try:
+        processor.read_frame_num = processor.iter_qr_codes_in_video(
+            vid_cap, 0, QR_CODE_AREAS
+        )
+    finally:
+        vid_cap.release()
+    return processor
+
+
+@pytest.mark.parametrize("use_luma_plane_scan", ["False", "True"])
+def test_worker_scan_matches_sequential_scan(
+    tmp_path, global_configurations, use_luma_plane_scan
+):
+    """QR codes scanned by workers are processed the same as scanned in order,
+    with the recording properties read from the same video capture"""
+    global_configurations.config["GENERAL"]["use_luma_plane_scan"] = use_luma_plane_scan
+    file_path = str(tmp_path / "recording.avi")
+    write_recording(file_path)
+
+    vid_cap = open_video_capture(file_path, global_configurations)
+    sequential_properties = VideoProperties(vid_cap)
+    vid_cap.release()
+    sequential_processor = scan_sequentially(file_path, global_configurations)
+    sequential_frame_num = sequential_processor.read_frame_num
+
+    worker_properties, scanned_qr_codes = scan_qr_codes_in_video(
+        file_path, QR_CODE_AREAS, False, global_configurations
+    )
+    worker_processor = create_processor(global_configurations)
+    worker_frame_num = worker_processor.iter_scanned_qr_codes(scanned_qr_codes, 0)
+
+    assert vars(worker_properties) == vars(sequential_properties)
+    assert worker_properties.fps == FPS
+    assert worker_frame_num == sequential_frame_num == FRAME_NUM
+    assert worker_processor.processed_frames == sequential_processor.processed_frames
+    # the first pre-test QR code is found on a frame skipped by the sparse scan
+    assert (25, [PRE_TEST_1]) in sequential_processor.processed_frames
+
+
+def test_luma_plane_scan_matches_grayscale_scan(tmp_path, global_configurations):
+    """QR codes detected on the luma plane are the same as on the frames
+    converted to grayscale"""
+    file_path = str(tmp_path / "recording.avi")
+    write_recording(file_path)
+
+    grayscale_processor = scan_sequentially(file_path, global_configurations)
+
+    global_configurations.config["GENERAL"]["use_luma_plane_scan"] = "True"
+    vid_cap = open_video_capture(file_path, global_configurations)
+    is_luma_plane_scan = isinstance(vid_cap, LumaVideoCapture)
+    vid_cap.release()
+    if not is_luma_plane_scan:
+        pytest.skip("frames are not decoded to a luma plane by this OpenCV build")
+    luma_processor = scan_sequentially(file_path, global_configurations)
+
+    assert luma_processor.read_frame_num == grayscale_processor.read_frame_num
+    assert luma_processor.processed_frames == grayscale_processor.processed_frames
@@ -0,0 +1,455 @@
+# -*- coding: utf-8 -*-
+"""WAVE DPCTF video capture handler
+
+Open recording files for frame by frame reading.
+NVDEC (cv2.cudacodec) decoding is used when it is configured and available,
+otherwise the OpenCV CPU decoder cv2.VideoCapture is used.
+
+The Software is provided to you by the Licensor under the License, as
+defined below, subject to the following condition.
+
+Without limiting other conditions in the License, the grant of rights under
+the License will not include, and the License does not grant to you, the
+right to Sell the Software.
+
+For purposes of the foregoing, “Sell” means practicing any or all of the
+rights granted to you under the License to provide to third parties, for a
+fee or other consideration (including without limitation fees for hosting
+or consulting/ support services related to the Software), a product or
+service whose value derives, entirely or substantially, from the
+functionality of the Software. Any license notice or attribution required
+by the License must also include this Commons Clause License Condition
+notice.
+
+Software: WAVE Observation Framework
+License: Apache 2.0 https://www.apache.org/licenses/LICENSE-2.0.txt
+Licensor: Consumer Technology Association
+Contributor: Resillion UK Limited
+"""
+import logging
+import os
+import queue
+import threading
+from collections import deque
+from typing import Any, Optional, Tuple
+
+import cv2
+
+from global_configurations import GlobalConfigurations
+
+logger = logging.getLogger(__name__)
+
+FRAME_QUEUE_SIZE = 8
+"""number of decoded frames to read ahead, this is kept small
+as each 4K frame takes around 25MB of memory"""
+
+class VideoProperties:
+    """Recording properties read once from a video capture"""
+
+    fps: float
+    """recording frame rate"""
+    width: int
+    """recording image width"""
+    height: int
+    """recording image height"""
+    frame_count: int
+    """number of frames in the recording"""
+
+    def __init__(self, vid_cap):
+        self.fps = vid_cap.get(cv2.CAP_PROP_FPS)
+        self.width = int(vid_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(vid_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.frame_count = int(vid_cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    def get(self, prop_id: int) -> float:
+        """Get property by cv2.CAP_PROP_* id, 0 when it is unknown"""
+        if prop_id == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.width
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.height
+        if prop_id == cv2.CAP_PROP_FRAME_COUNT:
+            return self.frame_count
+        return 0
+
+    def is_valid(self) -> bool:
+        """Check the recording is a valid video"""
+        return self.fps >= 1 and self.width > 0 and self.height > 0
+
+
+class GpuVideoCapture:
+    """cv2.VideoCapture like reader decoding with cv2.cudacodec.VideoReader.
+
+    Frames are converted to grayscale on the GPU and only the grayscale
+    image is downloaded. Frames are read in order only, seeking is not
+    supported.
+    """
+
+    reader: Any
+    """cv2.cudacodec.VideoReader instance"""
+
+    def __init__(self, input_video_path_str: str):
+        self.reader = cv2.cudacodec.createVideoReader(input_video_path_str)
+
+    def get(self, prop_id: int) -> float:
+        """Get recording property by cv2.CAP_PROP_* id from the FFmpeg demuxer
+        of the reader, 0 when it is unknown"""
+        got_value, value = self.reader.get(prop_id)
+        if not got_value:
+            return 0
+        return value
+
+    def set(self, prop_id: int, value: float) -> bool:
+        """Seeking is not supported, cudacodec readers only read forward.
+        Open the recording with open_video_capture(seekable=True) to seek.
+
+        Raises:
+            ValueError: when a position is set
+        """
+        if prop_id in (cv2.CAP_PROP_POS_MSEC, cv2.CAP_PROP_POS_FRAMES):
+            raise ValueError("Seeking is not supported when decoding on GPU.")
+        return False
+
+    def read(self, image: Any = None) -> Tuple[bool, Any]:
+        """Decode next frame and return it as grayscale image.
+        image is downloaded to when it is given, as cv2.VideoCapture.read does.
+        """
+        got_frame, gpu_frame = self.reader.nextFrame()
+        return self._download_gray(got_frame, gpu_frame, image)
+
+    def grab(self) -> bool:
+        """Decode next frame without downloading it"""
+        return self.reader.grab()
+
+    def retrieve(self, image: Any = None) -> Tuple[bool, Any]:
+        """Return the grabbed frame as grayscale image"""
+        got_frame, gpu_frame = self.reader.retrieve()
+        return self._download_gray(got_frame, gpu_frame, image)
+
+    @staticmethod
+    def _download_gray(got_frame: bool, gpu_frame: Any, image: Any) -> Tuple[bool, Any]:
+        """Convert decoded frame to grayscale on the GPU and download it"""
+        if not got_frame:
+            return False, None
+        gpu_gray = cv2.cuda.cvtColor(gpu_frame, cv2.COLOR_BGRA2GRAY)
+        return True, gpu_gray.download(image)
+
+    def release(self) -> None:
+        """Release the reader"""
+        self.reader = None
+
+
+class ThreadedVideoCapture:
+    """Read ahead frames of a video capture on a separate thread.
+
+    Decoding releases the GIL inside OpenCV so the next frames are decoded
+    while the current frame is being scanned for QR codes.
+    Recording properties are read before the thread starts,
+    so that the capture is not accessed from two threads at the same time.
+
+    Reading ahead starts once two frames in a row are retrieved. Until then
+    grab() and retrieve() are passed to the video capture, so frames that are
+    skipped with grab() are not retrieved at all.
+
+    Frames are decoded into a fixed ring of buffers instead of a new image
+    for each frame. A frame returned by retrieve() stays valid until
+    kept_frame_num further frames are grabbed, then its buffer is reused.
+    """
+
+    vid_cap: Any
+    """video capture instance to read frames from"""
+    video_properties: VideoProperties
+    """cached recording properties"""
+    frame_queue: queue.Queue
+    """queue of (got_frame, image) read ahead"""
+    free_buffers: queue.Queue
+    """frame buffers free to decode to, None until OpenCV allocates the buffer"""
+    current_frame: Tuple[bool, Any]
+    """(got_frame, image) of the frame last grabbed"""
+    kept_frame_num: int
+    """number of previously retrieved frames kept valid e.g. while being scanned"""
+    kept_images: deque
+    """images of previously retrieved frames, oldest first"""
+    is_retrieved: bool
+    """whether the frame last grabbed is retrieved"""
+    was_retrieved: bool
+    """whether the frame grabbed before the last one was retrieved"""
+    stop_event: threading.Event
+    """set to stop reading ahead"""
+    reader_thread: Optional[threading.Thread]
+    """thread reading frames to the queue, None until reading ahead starts"""
+
+    def __init__(
+        self, vid_cap, queue_size: int = FRAME_QUEUE_SIZE, kept_frame_num: int = 0
+    ):
+        self.vid_cap = vid_cap
+        self.video_properties = VideoProperties(vid_cap)
+        self.frame_queue = queue.Queue(maxsize=queue_size)
+        self.free_buffers = queue.Queue()
+        # frames in the queue, the frame being decoded, the current frame
+        # and the frames kept
+        for _ in range(queue_size + 2 + kept_frame_num):
+            self.free_buffers.put(None)
+        self.current_frame = (False, None)
+        self.kept_frame_num = kept_frame_num
+        self.kept_images = deque()
+        self.is_retrieved = False
+        self.was_retrieved = False
+        self.stop_event = threading.Event()
+        self.reader_thread = None
+
+    def _read_frames(self) -> None:
+        """Read frames to the queue until stopped.
+        Failed reads are queued as well, the reader decides whether
+        to carry on after a corrupted frame or to stop.
+        """
+        while not self.stop_event.is_set():
+            try:
+                buffer = self.free_buffers.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            # decoded in place when the buffer matches the frame
+            frame = self.vid_cap.read(buffer)
+            if frame[1] is None:
+                # nothing is decoded, keep the buffer in the ring
+                self.free_buffers.put(buffer)
+            while not self.stop_event.is_set():
+                try:
+                    self.frame_queue.put(frame, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+    def get(self, prop_id: int) -> float:
+        """Get cached recording property, 0 when it is unknown"""
+        return self.video_properties.get(prop_id)
+
+    def _keep_current_image(self) -> None:
+        """Keep the current frame image, buffer of the oldest kept image is reused"""
+        if self.current_frame[1] is not None:
+            self.kept_images.append(self.current_frame[1])
+        while len(self.kept_images) > self.kept_frame_num:
+            self.free_buffers.put(self.kept_images.popleft())
+
+    def grab(self) -> bool:
+        """Go to the next frame"""
+        self._keep_current_image()
+        if self.reader_thread is None:
+            self.was_retrieved = self.is_retrieved
+            self.is_retrieved = False
+            got_frame = self.vid_cap.grab()
+            self.current_frame = (got_frame, None)
+            return got_frame
+
+        self.current_frame = self.frame_queue.get()
+        return self.current_frame[0]
+
+    def retrieve(self) -> Tuple[bool, Any]:
+        """Get the frame last grabbed"""
+        if self.reader_thread is None and not self.is_retrieved:
+            # decoded to a free buffer of the ring
+            try:
+                buffer = self.free_buffers.get_nowait()
+            except queue.Empty:
+                buffer = None
+            self.current_frame = self.vid_cap.retrieve(buffer)
+            if self.current_frame[1] is None:
+                self.free_buffers.put(buffer)
+            self.is_retrieved = True
+            if self.was_retrieved:
+                # frames are read one after another, read ahead from the next frame
+                self.reader_thread = threading.Thread(
+                    target=self._read_frames, daemon=True
+                )
+                self.reader_thread.start()
+        return self.current_frame
+
+    def read(self) -> Tuple[bool, Any]:
+        """Grab and retrieve the next frame"""
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def release(self) -> None:
+        """Stop reading ahead and release the video capture"""
+        if self.reader_thread is not None:
+            self.stop_event.set()
+            self.reader_thread.join()
+        self.vid_cap.release()
+
+
+class LumaVideoCapture:
+    """cv2.VideoCapture reader returning the luma plane of YUV 4:2:0 frames.
+
+    When CAP_PROP_CONVERT_RGB is disabled the FFmpeg backend returns frames
+    as one single channel image of 3/2 the frame height, with the luma plane
+    on top. QR codes are scanned on the luma plane, so it is returned as a
+    grayscale view and no color conversion is done for the frame.
+    """
+
+    vid_cap: Any
+    """cv2.VideoCapture instance with RGB conversion disabled"""
+    height: int
+    """recording image height, number of rows of the luma plane"""
+
+    def __init__(self, vid_cap, height: int):
+        self.vid_cap = vid_cap
+        self.height = height
+
+    def get(self, prop_id: int) -> float:
+        """Get property of the video capture"""
+        return self.vid_cap.get(prop_id)
+
+    def set(self, prop_id: int, value: float) -> bool:
+        """Set property of the video capture"""
+        return self.vid_cap.set(prop_id, value)
+
+    def read(self, image: Any = None) -> Tuple[bool, Any]:
+        """Decode next frame and return its luma plane.
+        image is a luma plane returned before, the whole frame it is a view of
+        is decoded to.
+        """
+        got_frame, frame = self.vid_cap.read(self._frame_of(image))
+        if not got_frame:
+            return False, frame
+        return True, frame[: self.height]
+
+    def grab(self) -> bool:
+        """Decode next frame without retrieving it"""
+        return self.vid_cap.grab()
+
+    def retrieve(self, image: Any = None) -> Tuple[bool, Any]:
+        """Return luma plane of the grabbed frame"""
+        got_frame, frame = self.vid_cap.retrieve(self._frame_of(image))
+        if not got_frame:
+            return False, frame
+        return True, frame[: self.height]
+
+    @staticmethod
+    def _frame_of(image: Any) -> Any:
+        """Get the whole frame a luma plane returned before is a view of"""
+        if image is not None and image.base is not None:
+            return image.base
+        return image
+
+    def release(self) -> None:
+        """Release the video capture"""
+        self.vid_cap.release()
+
+
+def _open_luma_video_capture(input_video_path_str: str, open_params: list) -> Any:
+    """Open recording with the FFmpeg backend, RGB conversion is disabled when
+    the backend then decodes to YUV 4:2:0 or grayscale frames.
+    The first frame is decoded to check it, then the recording is opened again
+    to read from the first frame, as seeking back is not frame accurate.
+
+    Returns:
+        LumaVideoCapture wrapping cv2.VideoCapture, or cv2.VideoCapture
+        when the frames are decoded to any other format,
+        None when the recording is not opened.
+    """
+    vid_cap = cv2.VideoCapture(input_video_path_str, cv2.CAP_FFMPEG, open_params)
+    if not vid_cap.isOpened():
+        vid_cap.release()
+        return None
+
+    width = int(vid_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(vid_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    if not vid_cap.set(cv2.CAP_PROP_CONVERT_RGB, 0):
+        return vid_cap
+
+    got_frame, frame = vid_cap.read()
+    is_luma_on_top = (
+        got_frame
+        and frame.ndim == 2
+        and frame.shape[0] in (height, height * 3 // 2)
+        and frame.shape[1] == width
+    )
+    vid_cap.release()
+
+    vid_cap = cv2.VideoCapture(input_video_path_str, cv2.CAP_FFMPEG, open_params)
+    if not vid_cap.isOpened():
+        vid_cap.release()
+        return None
+    if is_luma_on_top and vid_cap.set(cv2.CAP_PROP_CONVERT_RGB, 0):
+        logger.debug("Scanning luma plane of frames decoded without RGB conversion.")
+        return LumaVideoCapture(vid_cap, height)
+    return vid_cap
+
+
+def get_worker_thread_num(global_configurations: GlobalConfigurations) -> int:
+    """Get number of CPU threads for each process,
+    CPUs are shared between the worker processes"""
+    return max((os.cpu_count() or 1) // global_configurations.get_workers(), 1)
+
+
+def configure_opencv_threads(global_configurations: GlobalConfigurations) -> None:
+    """Enable OpenCV optimized code and set the number of threads of
+    OpenCV parallel primitives (cvtColor, resize, adaptiveThreshold),
+    to be called once in each process before processing frames."""
+    cv2.setUseOptimized(True)
+    cv2.setNumThreads(get_worker_thread_num(global_configurations))
+
+
+def get_max_corrupted_frame_num(
+    fps: float, global_configurations: GlobalConfigurations
+) -> int:
+    """Get number of consecutive corrupted frames ignored before the recording
+    is taken as ended, from corrupted_frame_timeout in seconds of the recording.
+    0 when there is no limit."""
+    return int(global_configurations.get_corrupted_frame_timeout() * fps)
+
+
+def open_video_capture(
+    input_video_path_str: str,
+    global_configurations: GlobalConfigurations,
+    seekable: bool = False,
+):
+    """Open recording file to read frame by frame.
+    GPU decoding is used when use_gpu_decode is enabled and
+    OpenCV is built with CUDA video decoding, unless the recording
+    needs to be seekable,
+    otherwise the FFmpeg backend of cv2.VideoCapture is used,
+    with FFmpeg hardware decoding when use_gpu_decode is enabled,
+    reading only the luma plane when use_luma_plane_scan is enabled
+    and the decoded frames allow it.
+    falls back to the default cv2.VideoCapture backend on any failure.
+    """
+    if global_configurations.get_use_gpu_decode() and not seekable:
+        try:
+            if cv2.cuda.getCudaEnabledDeviceCount() < 1:
+                raise cv2.error("no CUDA enabled device is found")
+            vid_cap = GpuVideoCapture(input_video_path_str)
+            logger.debug("Decoding '%s' on GPU.", input_video_path_str)
+            return vid_cap
+        except (AttributeError, cv2.error) as exc:
+            logger.warning(
+                "GPU decoding is not available, CPU decoding is used instead. %s", exc
+            )
+
+    # open with FFmpeg explicitly, default backend on Windows can be MSMF
+    try:
+        open_params = [
+            cv2.CAP_PROP_N_THREADS,
+            get_worker_thread_num(global_configurations),
+        ]
+        if global_configurations.get_use_gpu_decode():
+            # e.g. VAAPI, D3D11 or Intel Media SDK, FFmpeg decodes on CPU without one
+            open_params += [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+        if global_configurations.get_use_luma_plane_scan():
+            vid_cap = _open_luma_video_capture(input_video_path_str, open_params)
+            if vid_cap is not None:
+                return vid_cap
+        else:
+            vid_cap = cv2.VideoCapture(
+                input_video_path_str, cv2.CAP_FFMPEG, open_params
+            )
+            if vid_cap.isOpened():
+                return vid_cap
+            vid_cap.release()
+    except (AttributeError, cv2.error):
+        # OpenCV build without FFmpeg backend or open parameters
+        pass
+
+    return cv2.VideoCapture(input_video_path_str)